@@ -1,8 +1,9 @@
 from fastapi import APIRouter
 
-from api.endpoints.general import accounts, auth, webhooks
+from api.endpoints.general import accounts, auth, metrics, webhooks
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["Auth"])
 api_router.include_router(accounts.router, prefix="/accounts", tags=["Accounts"])
 api_router.include_router(webhooks.router, prefix="/webhooks", tags=["Webhooks"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
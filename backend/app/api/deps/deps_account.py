@@ -2,33 +2,42 @@ from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import errors
+import schemas
 from models import Account
 from extra.enums import Roles
+from core.principal import principals
 
-from .deps_auth import get_user_id_from_token, db_session
+from .deps_auth import get_user_id_from_token, db_session_read_only
 
 
 async def get_current_user(
-    db: AsyncSession = Depends(db_session),
+    db: AsyncSession = Depends(db_session_read_only),
     account_id: int = Depends(get_user_id_from_token),
-) -> Account:
+) -> schemas.Principal:
+    principal = await principals.get(account_id)
+    if principal is not None:
+        return principal
+
     account = await Account.where(id=account_id).one_or_none(db)
     if not account:
         raise errors.AccountNotFound
-    return account
+
+    principal = schemas.Principal.from_account(account)
+    await principals.set(principal)
+    return principal
 
 
 async def get_current_active_user(
-    account: Account = Depends(get_current_user),
-) -> Account:
-    if not account.is_active:
+    principal: schemas.Principal = Depends(get_current_user),
+) -> schemas.Principal:
+    if not principal.is_active:
         raise errors.InactiveAccount
-    return account
+    return principal
 
 
 async def get_current_active_superuser(
-    account: Account = Depends(get_current_active_user),
-) -> Account:
-    if account.has_role(role=Roles.admin):
-        return account
+    principal: schemas.Principal = Depends(get_current_active_user),
+) -> schemas.Principal:
+    if principal.has_role(role=Roles.admin):
+        return principal
     raise errors.NotEnoughPrivileges
@@ -1,6 +1,7 @@
 from typing import Optional
+from contextlib import asynccontextmanager
 
-from fastapi import Depends, Body
+from fastapi import Depends, Body, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,7 +11,7 @@ import schemas
 from extra import enums
 from models import Account
 
-from db.sessions import in_transaction
+from db.sessions import lazy_session
 from core.security import decode_token
 
 
@@ -19,8 +20,43 @@ from core.security import decode_token
 http_bearer = HTTPBearer(auto_error=False)
 
 
-async def db_session():
-    async with in_transaction() as db:
+def get_endpoint_label(request: Request) -> str:
+    endpoint = request.scope.get("endpoint")
+    if endpoint is None:
+        return request.url.path
+    return f"{endpoint.__module__}.{endpoint.__name__}"
+
+
+@asynccontextmanager
+async def _request_session(request: Request, label: str, read_only: bool):
+    """
+    Session of the request, which is shared by all its dependencies,
+    so they share the identity map too. Read-only dependencies reuse
+    the primary session, if the request has opened it already.
+    """
+    session: Optional[AsyncSession] = getattr(request.state, "db", None)
+    if session is not None and (read_only or not session.info.get("read_only")):
+        yield session
+        return
+
+    async with lazy_session(read_only=read_only, label=label) as session:
+        request.state.db = session
+        yield session
+
+
+async def db_session(
+    request: Request,
+    label: str = Depends(get_endpoint_label),
+):
+    async with _request_session(request, label, read_only=False) as db:
+        yield db
+
+
+async def db_session_read_only(
+    request: Request,
+    label: str = Depends(get_endpoint_label),
+):
+    async with _request_session(request, label, read_only=True) as db:
         yield db
 
 
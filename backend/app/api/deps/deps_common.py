@@ -2,7 +2,22 @@ from typing import Optional
 
 
 class CommonQueryParams:
-    def __init__(self, q: Optional[str] = None, skip: int = 0, limit: int = 20):
+    """
+    Page is selected by skip and limit or by cursor, which is given
+    in meta of the previous page (keyset pagination).
+    Sort is a comma separated list of attributes, like `-created_at,email`.
+    """
+
+    def __init__(
+        self,
+        q: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20,
+        sort: str = 'id',
+        cursor: Optional[str] = None,
+    ):
         self.q = q
         self.skip = skip
         self.limit = limit
+        self.sort = [attr.strip() for attr in sort.split(',') if attr.strip()]
+        self.cursor = cursor
@@ -1,15 +1,16 @@
 from typing import Any
 from fastapi import APIRouter, Depends
 
-from sqlalchemy import delete, select
+from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import errors
 import schemas
 
 from models import Account, AuthorizationData
-from utils import decorators
+from utils import decorators, pagination
 from helpers import help_account
+from db.sessions import release
 
 from extra import enums
 from services.mailing import messages
@@ -26,10 +27,11 @@ router = APIRouter()
     response_model=schemas.Account
 )
 async def get_me(
-    account: Account = Depends(deps_account.get_current_active_superuser),
+    db: AsyncSession = Depends(deps_auth.db_session),
+    principal: schemas.Principal = Depends(deps_account.get_current_active_superuser),
 ) -> Any:
     """Get a current user"""
-    return account
+    return await Account.where(id=principal.id).one(db)
 
 
 @router.get(
@@ -39,8 +41,8 @@ async def get_me(
 )
 async def read_account_by_id(
     object_id: int,
-    db: AsyncSession = Depends(deps_auth.db_session),
-    _: Account = Depends(deps_account.get_current_active_superuser),
+    db: AsyncSession = Depends(deps_auth.db_session_read_only),
+    _: schemas.Principal = Depends(deps_account.get_current_active_superuser),
 ) -> Any:
     """Get a specific user by id"""
     return await Account.where(id=object_id).one(db)
@@ -48,24 +50,21 @@ async def read_account_by_id(
 
 @router.get(
     "/",
-    response_model=schemas.ResultSchema
+    response_model=schemas.ResultSchema,
+    responses=with_errors(errors.BadSortParams, errors.BadCursor),
 )
 @decorators.add_count(
     response_model=Account,
-    response_schema=schemas.Account
+    response_schema=schemas.Account,
+    count_strategy=enums.CountStrategy.estimate,
 )
 async def read_accounts(
     commons: deps_common.CommonQueryParams = Depends(),
-    db: AsyncSession = Depends(deps_auth.db_session),
-    _: Account = Depends(deps_account.get_current_active_superuser),
+    db: AsyncSession = Depends(deps_auth.db_session_read_only),
+    _: schemas.Principal = Depends(deps_account.get_current_active_superuser),
 ) -> Any:
     """Retrieve accounts"""
-    accounts = await select(Account) \
-        .offset(commons.skip) \
-        .limit(commons.limit) \
-        .all(db)
-
-    return accounts, db
+    return pagination.paginate(Account, commons), db
 
 
 @router.post(
@@ -77,7 +76,7 @@ async def create_account(
     *,
     schema_in: schemas.AccountCreate,
     db: AsyncSession = Depends(deps_auth.db_session),
-    _: Account = Depends(deps_account.get_current_active_superuser),
+    _: schemas.Principal = Depends(deps_account.get_current_active_superuser),
 ) -> Any:
     """Create new account"""
     if await help_account.is_email_exists(db, email=schema_in.email):
@@ -100,7 +99,7 @@ async def update_account(
     object_id: int,
     schema_in: schemas.AccountUpdate,
     db: AsyncSession = Depends(deps_auth.db_session),
-    _: Account = Depends(deps_account.get_current_active_superuser),
+    _: schemas.Principal = Depends(deps_account.get_current_active_superuser),
 ) -> Any:
     """Update specific user by id"""
     db_obj = await Account.where(id=object_id).one(db)
@@ -115,7 +114,7 @@ async def update_account(
 async def delete_object_by_id(
     object_id: int,
     db: AsyncSession = Depends(deps_auth.db_session),
-    _: Account = Depends(deps_account.get_current_active_superuser),
+    _: schemas.Principal = Depends(deps_account.get_current_active_superuser),
 ) -> Any:
     """Delete specific user by id"""
     await delete(Account).filter_by(id=object_id).execute(db)
@@ -140,11 +139,11 @@ async def account_registration(
         email=schema_in.email,
         password=schema_in.password,
     )
-
     await messages.ConfirmAccountMessage(
         account_id=account.id,
         email=schema_in.email,
-    ).send()
+    ).enqueue(db)
+    await release(db)
 
     return schemas.ResultResponse()
 
@@ -159,7 +158,7 @@ async def change_account_password(
     db: AsyncSession = Depends(deps_auth.db_session)
 ) -> Any:
     """Send email to change user password"""
-    auth_data = AuthorizationData.where(
+    auth_data = await AuthorizationData.where(
         login=schema_in.login,
         registration_type=enums.RegistrationTypes.forms,
     ).one_or_none(db)
@@ -171,6 +170,7 @@ async def change_account_password(
     await messages.ChangePasswordMessage(
         account_id=auth_data.account_id,
         email=schema_in.login
-    ).send()
+    ).enqueue(db)
+    await release(db)
 
     return schemas.ResultResponse()
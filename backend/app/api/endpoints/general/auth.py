@@ -68,7 +68,7 @@ async def refresh_token(
     )
 )
 async def user_is_auth(
-    _: models.Account = Depends(deps_account.get_current_active_user)
+    _: schemas.Principal = Depends(deps_account.get_current_active_user)
 ) -> Any:
     """Token validation of active user."""
     return schemas.ResultResponse()
@@ -112,7 +112,7 @@ async def social_login_get_token(
     form: schemas.GetTokenBySocialCode = Body(...),
 ) -> Any:
     """Obtaining a login token after successful authorization in social networks."""
-    return socials.get_token(form.code)
+    return await socials.get_token(form.code)
 
 
 @router.post(
@@ -0,0 +1,33 @@
+from typing import Any
+from fastapi import APIRouter, Depends
+
+import schemas
+from db.sessions import engine
+from db.pool import get_pool_stats, get_hold_stats
+
+from api.deps import deps_account
+
+
+router = APIRouter()
+
+
+@router.get(
+    "/pool",
+    response_model=schemas.PoolStats,
+)
+async def read_pool_stats(
+    _: schemas.Principal = Depends(deps_account.get_current_active_superuser),
+) -> Any:
+    """Connection pool stats of the worker, which handles the request"""
+    return get_pool_stats(engine)
+
+
+@router.get(
+    "/connections",
+    response_model=list[schemas.HoldStats],
+)
+async def read_hold_stats(
+    _: schemas.Principal = Depends(deps_account.get_current_active_superuser),
+) -> Any:
+    """Time of holding DB connections per endpoint in the worker"""
+    return get_hold_stats()
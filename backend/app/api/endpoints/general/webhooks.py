@@ -13,6 +13,7 @@ from services.mailing import messages
 
 from extra.enums import SocialTypes
 from core.security import generate_token
+from db.sessions import release
 
 from api.deps import deps_auth
 from api.responses import with_errors
@@ -32,7 +33,8 @@ async def confirm_account(
 ) -> Any:
     """Confirms the account, logs in the user and returns the token"""
     auth_data = await help_auth.confirm_account(db, params)
-    await messages.SuccessfulRegistrationMessage(email=auth_data.login).send()
+    await messages.SuccessfulRegistrationMessage(email=auth_data.login).enqueue(db)
+    await release(db)
     return generate_token(auth_data.account_id)
 
 
@@ -49,7 +51,8 @@ async def change_password(
     auth_data = await help_auth.change_password(db, params)
     await messages.PasswordWasChangedMessage(
         email=auth_data.login
-    ).send()
+    ).enqueue(db)
+    await release(db)
     return schemas.ResultResponse()
 
 
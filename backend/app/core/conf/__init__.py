@@ -1,4 +1,4 @@
 from .conf_server import ServerSettings
 from .conf_auth import AuthSettings
-from .conf_database import DatabaseSettings
+from .conf_database import DatabaseSettings, RedisSettings
 from .conf_mailing import MailingSettings
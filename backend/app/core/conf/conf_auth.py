@@ -11,13 +11,38 @@ class AuthSettings(BaseSettings):
     # 60 minutes
     EMAIL_CODE_EXPIRE_MINUTES: int = 60 * 60
 
+    # seconds to keep authenticated accounts in cache
+    PRINCIPAL_CACHE_TTL: int = 30
+    PRINCIPAL_CACHE_SIZE: int = 10_000
+    # share cache between workers in redis
+    PRINCIPAL_CACHE_REDIS: bool = False
+
+    # seconds to keep users of social logins till getting of token
+    SOCIAL_STATE_TTL: int = 10 * 60
+    SOCIAL_STATE_SIZE: int = 10_000
+    # share social logins between workers in redis
+    SOCIAL_STATE_REDIS: bool = False
+
+    # bcrypt threads per worker and count of calls waiting for them
+    PASSWORD_HASHING_CONCURRENCY: int = 4
+    PASSWORD_HASHING_QUEUE_SIZE: int = 64
+
+    # requests to each OAuth service at once per worker, see OAuthProvider
+    OAUTH_CONCURRENCY: int = 20
+    # retries of requests, which didn't reach OAuth service
+    OAUTH_RETRIES: int = 2
+
     OAUTH_VK_CLIENT_ID: str
     OAUTH_VK_CLIENT_SECRET: str
     OAUTH_VK_REDIRECT_URI: str
+    OAUTH_VK_API_URL: str = 'https://oauth.vk.com'
+    OAUTH_VK_TIMEOUT: float = 5
 
     OAUTH_FB_CLIENT_ID: str
     OAUTH_FB_CLIENT_SECRET: str
     OAUTH_FB_REDIRECT_URI: str
+    OAUTH_FB_API_URL: str = 'https://graph.facebook.com'
+    OAUTH_FB_TIMEOUT: float = 5
 
     OAUTH_GOOGLE_CLIENT_ID: str
     OAUTH_GOOGLE_CLIENT_SECRET: str
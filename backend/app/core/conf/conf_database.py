@@ -12,6 +12,8 @@ from pydantic import (
 )
 from pydantic.fields import ModelField
 
+from extra.enums import ReplicaSelection
+
 
 class DatabaseSettings(BaseSettings):
     POSTGRES_SERVER: Optional[str]
@@ -21,6 +23,13 @@ class DatabaseSettings(BaseSettings):
     POSTGRES_PORT: Optional[str]
     SQLALCHEMY_DATABASE_URI: Optional[str] = None
     SQLALCHEMY_DATABASE_URI_HIDDEN_PWD: Optional[str] = None
+    # read-only sessions go to replicas, JSON list
+    SQLALCHEMY_REPLICA_URIS: list[str] = []
+    DB_REPLICA_SELECTION: ReplicaSelection = ReplicaSelection.round_robin
+    # seconds to skip replica after failed connection
+    DB_REPLICA_RETRY_AFTER: int = 30
+    # seconds replicas can be behind primary
+    DB_REPLICA_MAX_LAG: float = 1
 
     @validator(
         "SQLALCHEMY_DATABASE_URI",
@@ -45,6 +54,42 @@ class DatabaseSettings(BaseSettings):
             port=values.get("POSTGRES_PORT"),
         )
 
+    # connection pool of a worker, see create_engine of SQLAlchemy
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    # seconds, -1 - connections are not recycled
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    # prepared statements cached by asyncpg per connection, 0 for pgbouncer
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # connections of all workers of the host, pools are shrunk to fit it
+    DB_MAX_CONNECTIONS: Optional[int] = None
+    # uvicorn workers of the host
+    WEB_CONCURRENCY: int = 1
+
+    @property
+    def pool_params(self) -> dict[str, Any]:
+        pool_size, max_overflow = self.DB_POOL_SIZE, self.DB_MAX_OVERFLOW
+        if self.DB_MAX_CONNECTIONS:
+            per_worker = max(self.DB_MAX_CONNECTIONS // self.WEB_CONCURRENCY, 1)
+            pool_size = min(pool_size, per_worker)
+            max_overflow = max(min(max_overflow, per_worker - pool_size), 0)
+
+        return dict(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=self.DB_POOL_TIMEOUT,
+            pool_recycle=self.DB_POOL_RECYCLE,
+            pool_pre_ping=self.DB_POOL_PRE_PING,
+        )
+
+    # lists with estimated count below threshold are counted exactly
+    COUNT_ESTIMATE_THRESHOLD: int = 100_000
+    # seconds to keep cached counts
+    COUNT_CACHE_TTL: int = 60
+    COUNT_CACHE_SIZE: int = 1024
+
 
 class RedisSettings(BaseSettings):
     """Настройки редиса"""
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseSettings
 
 
@@ -7,4 +9,23 @@ class MailingSettings(BaseSettings):
     COMPANY_EMAIL: str
     COMPANY_NAME: str
 
+    # directory of compiled email templates, shared by workers and restarts
+    EMAIL_TEMPLATES_CACHE_DIR: Optional[str] = None
+
     SEND_GRID_KEY: str
+    SEND_GRID_URL: str = "https://api.sendgrid.com/v3/mail/send"
+    SEND_GRID_TIMEOUT: float = 10
+    # limit of personalizations (recipients) in one request
+    SEND_GRID_MAX_PERSONALIZATIONS: int = 1000
+
+    # outbox dispatcher, see services.mailing.outbox
+    EMAIL_OUTBOX_BATCH_SIZE: int = 100
+    EMAIL_OUTBOX_CONCURRENCY: int = 10
+    # seconds between checks of outbox, if there is nothing to send
+    EMAIL_OUTBOX_POLL_INTERVAL: float = 5
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 8
+    # delay before retry in seconds, doubled by each failed attempt
+    EMAIL_OUTBOX_RETRY_BACKOFF: float = 10
+    EMAIL_OUTBOX_MAX_RETRY_BACKOFF: float = 60 * 60
+    # email claimed by dispatcher isn't claimed by other ones for the time
+    EMAIL_OUTBOX_LEASE: float = 60
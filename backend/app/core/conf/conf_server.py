@@ -36,6 +36,13 @@ class ServerSettings(BaseSettings):
 
     SENTRY_DSN: Optional[str] = None
 
+    # shared HTTP client, see sessions.Sessions
+    HTTP_CLIENT_TIMEOUT: float = 10
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    # requires h2 package (httpx[http2])
+    HTTP_CLIENT_HTTP2: bool = False
+
     FIRST_SUPERUSER_LOGIN: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
 
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from typing import Optional, Union
+
+from aiocache import Cache
+from aiocache.base import BaseCache
+from sqlalchemy import Column, event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import FromClause
+
+from schemas import Principal
+from core.settings import settings
+from utils.cache import TTLCache, redis_clear
+
+
+logger = logging.getLogger("principal")
+
+
+class PrincipalCache:
+    """
+    Cache of authenticated accounts, so auth dependencies skip DB.
+
+    Principals are kept in-process and, if redis is given, in redis
+    shared by workers. Changes of accounts must be invalidated, yet another
+    worker can see the old principal in its in-process cache until ttl expires.
+    Redis failures are logged and treated as misses.
+
+    Changes are invalidated when their transaction is committed (see
+    invalidate_on_commit), otherwise a concurrent request could cache the old
+    row again. With read replicas principals are invalidated once more after
+    replica_lag seconds, while replicas can still serve the old row.
+    Bulk DELETE of watched tables and UPDATE of their watched columns
+    invalidates accounts of affected rows (see watch).
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: int,
+        redis: Optional[BaseCache] = None,
+        replica_lag: float = 0,
+    ):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis
+        self.replica_lag = replica_lag
+        # tables, which rows change principals, by their account id column
+        # and names of columns, which change principals
+        self.watched: dict[FromClause, tuple[Column, frozenset[str]]] = {}
+        self._pending: set[asyncio.Future] = set()
+
+    async def get(self, account_id: int) -> Optional[Principal]:
+        principal = self.local.get(account_id)
+        if principal is not None or self.redis is None:
+            return principal
+
+        try:
+            raw = await self.redis.get(account_id)
+        except Exception:
+            logger.exception("Can't get principal %s from redis", account_id)
+            return None
+
+        if raw is not None:
+            principal = Principal.parse_raw(raw)
+            self.local.set(account_id, principal)
+        return principal
+
+    async def set(self, principal: Principal) -> None:
+        self.local.set(principal.id, principal)
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.set(principal.id, principal.json(), ttl=self.ttl)
+        except Exception:
+            logger.exception("Can't set principal %s to redis", principal.id)
+
+    async def invalidate(self, *account_ids: int) -> None:
+        for account_id in account_ids:
+            self.local.pop(account_id)
+            if self.redis is None:
+                continue
+
+            try:
+                await self.redis.delete(account_id)
+            except Exception:
+                logger.exception("Can't delete principal %s in redis", account_id)
+
+    def invalidate_on_commit(
+        self,
+        session: Union[Session, AsyncSession],
+        *account_ids: int,
+    ) -> None:
+        """Invalidate principals, when the transaction of session is committed"""
+        session.info.setdefault("principals", set()).update(account_ids)
+
+    async def invalidate_committed(self, session: AsyncSession) -> None:
+        """Invalidate principals changed by the committed transaction"""
+        account_ids = session.info.pop("committed_principals", None)
+        if not account_ids:
+            return
+        await self.invalidate(*account_ids)
+        if self.replica_lag:
+            self.invalidate_later(self.replica_lag, *account_ids)
+
+    def invalidate_later(self, delay: float, *account_ids: int) -> None:
+        async def invalidate():
+            await asyncio.sleep(delay)
+            await self.invalidate(*account_ids)
+
+        task = asyncio.ensure_future(invalidate())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def watch(self, account_id: Column, *changes: Column) -> None:
+        """
+        Invalidate accounts of account_id column on bulk DELETE of its table
+        and on bulk UPDATE of the changes columns
+        """
+        self.watched[account_id.table] = (
+            account_id, frozenset(column.name for column in changes)
+        )
+
+    async def clear(self) -> None:
+        self.local.clear()
+        if self.redis is not None:
+            await redis_clear(self.redis)
+
+
+def _get_redis() -> Optional[BaseCache]:
+    if not settings.PRINCIPAL_CACHE_REDIS:
+        return None
+    params = dict(settings.DEFAULT_CACHE_PARAMS)
+    return Cache(params.pop("cache"), namespace="principal:", **params)
+
+
+principals = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+    redis=_get_redis(),
+    replica_lag=settings.DB_REPLICA_MAX_LAG if settings.SQLALCHEMY_REPLICA_URIS else 0,
+)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_changes(orm_execute_state) -> None:
+    state = orm_execute_state
+    if not (state.is_update or state.is_delete) or state.session.info.get("read_only"):
+        return
+    watched = principals.watched.get(state.statement.table._deannotate())
+    if watched is None:
+        return
+    column, changes = watched
+    if state.is_update and not changes.intersection(_updated_columns(state.statement)):
+        return
+
+    # rows are selected before they're changed, as deleted ones can't be
+    account_ids = state.session.execute(
+        select(column).where(*state.statement._where_criteria).distinct(),
+        state.parameters,
+    ).scalars().all()
+    principals.invalidate_on_commit(state.session, *account_ids)
+
+
+def _updated_columns(statement) -> set[str]:
+    values = statement._ordered_values or statement._values or {}
+    return {getattr(key, "name", key) for key in dict(values)}
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_committed(session: Session) -> None:
+    # redis is awaited after commit by the async session, see invalidate_committed
+    account_ids = session.info.pop("principals", None)
+    if account_ids:
+        session.info.setdefault("committed_principals", set()).update(account_ids)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_principals(session: Session, transaction) -> None:
+    # changes of rolled back transaction are kept in cache
+    if transaction.parent is None:
+        session.info.pop("principals", None)
@@ -1,12 +1,14 @@
 import string
+import asyncio
 import secrets
-from typing import Optional
+from typing import Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime
 
 import itsdangerous.exc
 from jose import jwt
 from pydantic import ValidationError
-from itsdangerous import URLSafeTimedSerializer
+from itsdangerous import URLSafeSerializer, URLSafeTimedSerializer
 from passlib.context import CryptContext
 
 import errors
@@ -19,6 +21,11 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 signer = URLSafeTimedSerializer(settings.AUTH_SECRET_KEY)
 
+# datetimes are dumped as strings
+cursor_signer = URLSafeSerializer(
+    settings.AUTH_SECRET_KEY, salt="cursor", serializer_kwargs={"default": str}
+)
+
 alphabet = string.ascii_letters + string.digits
 
 
@@ -34,6 +41,65 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded thread pool, so hashing doesn't block event loop
+    (bcrypt releases GIL). Calls above concurrency wait in a queue,
+    and if the queue is full, ServerIsBusy is raised instead of piling up
+    requests.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix="password-hasher"
+            )
+        return self._executor
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        if self.pending >= self.concurrency + self.queue_size:
+            raise errors.ServerIsBusy
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    concurrency=settings.PASSWORD_HASHING_CONCURRENCY,
+    queue_size=settings.PASSWORD_HASHING_QUEUE_SIZE,
+)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.hash(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
 def generate_token(account_id: int) -> schemas.AuthToken:
     sub = str(account_id)
     now = datetime.utcnow()
@@ -86,3 +152,19 @@ def verify_confirmation_code(code: str, *fields: str) -> Optional[dict]:
     except itsdangerous.exc.BadSignature:
         # someone tampered the code
         raise errors.BadConfirmationCode
+
+
+def encode_cursor(sort_attrs: list[str], values: list) -> str:
+    """Opaque cursor of keyset pagination"""
+    return cursor_signer.dumps([sort_attrs, values])
+
+
+def decode_cursor(cursor: str, sort_attrs: list[str]) -> list:
+    try:
+        cursor_sort_attrs, values = cursor_signer.loads(cursor)
+    except (itsdangerous.exc.BadSignature, ValueError, TypeError):
+        raise errors.BadCursor
+    if cursor_sort_attrs != sort_attrs:
+        # cursor of another sorting
+        raise errors.BadCursor
+    return values
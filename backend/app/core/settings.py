@@ -1,9 +1,21 @@
 import os
 
-from .conf import AuthSettings, DatabaseSettings, MailingSettings, ServerSettings
+from .conf import (
+    AuthSettings,
+    DatabaseSettings,
+    MailingSettings,
+    RedisSettings,
+    ServerSettings,
+)
 
 
-class Settings(ServerSettings, DatabaseSettings, AuthSettings, MailingSettings):
+class Settings(
+    ServerSettings,
+    DatabaseSettings,
+    RedisSettings,
+    AuthSettings,
+    MailingSettings,
+):
     ...
 
     class Config:
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING, Any, Hashable, Iterable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+if TYPE_CHECKING:
+    from db.model import Model
+
+
+class Loader:
+    """
+    Batching loader of records by key (like DataLoader).
+
+    Calls of load() made in one tick of event loop (e.g. by asyncio.gather
+    or by coroutines of several helpers) are coalesced into one query
+    per model and key column. Results are cached while the loader lives,
+    cache is cleared after flush and at the end of transaction.
+
+    Key column should be unique (primary key by default), one record
+    is returned per key. The session mustn't be used by other queries
+    concurrently with the loader.
+
+    Example:
+        loader = get_loader(db)
+        account, auth_data = await asyncio.gather(
+            loader.load(Account, account_id),
+            loader.load(AuthorizationData, email, column="login"),
+        )
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self._cache: dict[tuple, asyncio.Future] = {}
+        self._batches: dict[tuple[Model, str], dict[Hashable, asyncio.Future]] = {}
+        self._scheduled = False
+        self._lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    def load(self, model: Model, key: Hashable, column: str = "id") -> asyncio.Future:
+        """Future of the record with the key or None, if it isn't found"""
+        cache_key = (model, column, key)
+        future = self._cache.get(cache_key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._cache[cache_key] = future
+        self._batches.setdefault((model, column), {})[key] = future
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(
+        self,
+        model: Model,
+        keys: Iterable[Hashable],
+        column: str = "id",
+    ) -> list[Optional[Model]]:
+        return list(await asyncio.gather(*(
+            self.load(model, key, column) for key in keys
+        )))
+
+    def clear(self) -> None:
+        self._cache = {
+            key: future for key, future in self._cache.items() if not future.done()
+        }
+
+    def _dispatch(self) -> None:
+        batches, self._batches = self._batches, {}
+        self._scheduled = False
+        task = asyncio.ensure_future(self._fetch(batches))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batches: dict) -> None:
+        for (model, column), futures in batches.items():
+            try:
+                # one session can't run queries concurrently
+                async with self._lock:
+                    found = await self._query(model, column, list(futures))
+            except Exception as e:
+                for key, future in futures.items():
+                    self._cache.pop((model, column, key), None)
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for key, future in futures.items():
+                if not future.done():
+                    future.set_result(found.get(key))
+
+    async def _query(self, model: Model, column: str, keys: list) -> dict:
+        pk = inspect(model).primary_key
+        if len(pk) == 1 and pk[0].key == column:
+            # identity map is checked first
+            instances = await model.find_many(self.session, keys, missing="none")
+            return dict(zip(keys, instances))
+
+        instances = await model.where(**{f"{column}__in": keys}).all(self.session)
+        found = {}
+        for instance in instances:
+            found.setdefault(getattr(instance, column), instance)
+        return found
+
+
+def get_loader(session: AsyncSession) -> Loader:
+    """Loader of the session, so it lives as long as the session (request)"""
+    loader = session.info.get("loader")
+    if loader is None:
+        loader = session.info["loader"] = Loader(session)
+    return loader
+
+
+@event.listens_for(Session, "after_flush")
+def _clear_after_flush(session: Session, flush_context) -> None:
+    # rows could be created or keys changed
+    _clear_loader(session)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_after_transaction(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        _clear_loader(session)
+
+
+def _clear_loader(session: Session) -> None:
+    loader: Any = session.info.get("loader")
+    if loader is not None:
+        loader.clear()
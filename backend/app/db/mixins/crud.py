@@ -1,11 +1,36 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Optional, Any, Iterable
+from typing import (
+    TYPE_CHECKING,
+    Optional,
+    Any,
+    Iterable,
+    Literal,
+    NamedTuple,
+    Sequence,
+    Union,
+)
 
-from sqlalchemy import exists
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import (
+    and_,
+    any_,
+    bindparam,
+    exists,
+    func,
+    insert,
+    inspect,
+    literal_column,
+    select,
+    tuple_,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, NoResultFound
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.schema import PrimaryKeyConstraint, UniqueConstraint
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from extra.enums import OnConflict
+from .eagerload import _flatten_schema, eager_expr
 from .inspection import InspectionMixin
 from .utils import classproperty
 
@@ -13,16 +38,40 @@ if TYPE_CHECKING:
     from db.model import Model
 
 
+# ids fetched by one query in find_many
+FIND_MANY_CHUNK_SIZE = 5000
+
+BULK_BATCH_SIZE = 1000
+# postgresql allows 32767 bind parameters per statement
+BULK_MAX_PARAMS = 32000
+
+# dialects supporting INSERT ... ON CONFLICT
+_upsert_inserts = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+# relations, which would be loaded by query, but not by upsert
+_EAGER_LOADS = ("joined", "selectin", "subquery")
+
+
+class BulkResult(NamedTuple):
+    inserted: int
+    updated: int
+
+
 class CRUDMixin(InspectionMixin):
     __abstract__ = True
 
     @classproperty
     def settable_attributes(cls) -> list[str]:
-        return cls.columns + cls.hybrid_properties + cls.settable_relations
+        return cls._metadata.settable_attributes
 
     def fill(self, **fields: str) -> Model:
+        settable = self._metadata.settable_set
         for name in fields.keys():
-            if name in self.settable_attributes:
+            if name in settable:
                 setattr(self, name, fields[name])
             else:
                 raise KeyError("Attribute '{}' doesn't exist".format(name))
@@ -54,12 +103,64 @@ class CRUDMixin(InspectionMixin):
     async def bulk_create(
         cls,
         session: AsyncSession,
-        objects: Iterable[Model]
-    ):
-        """Add and create the given collection of instances."""
-        session.add_all(objects)
-        await session.flush()
+        objects: Iterable[Union[Model, dict]],
+        on_conflict: Optional[OnConflict] = None,
+        conflict_columns: Sequence[str] = (),
+        update_columns: Optional[Sequence[str]] = None,
+        batch_size: int = BULK_BATCH_SIZE,
+    ) -> BulkResult:
+        """
+        Insert rows (dicts or instances) by multi-row INSERT statements.
+
+        Instances without on_conflict are added to the session and flushed,
+        as before, so they get primary keys and their relations are saved.
+        Other rows skip the unit of work: instances aren't added to the
+        session and instances already loaded in the session aren't refreshed.
+
+        With on_conflict rows conflicting on conflict_columns (unique columns,
+        like email) are skipped or update update_columns of existing rows
+        (all inserted columns except conflict ones by default). If a key repeats
+        in the rows, the first row is inserted, or the last one with update.
+
+        Example:
+            await Account.bulk_create(db, rows, OnConflict.update, ["email"])
+
+        Raises: ValueError, if OnConflict.update is given without conflict_columns
+        """
+        if on_conflict is OnConflict.update and not conflict_columns:
+            raise ValueError("OnConflict.update requires conflict_columns")
+
+        objects = list(objects)
+        if on_conflict is None and objects \
+                and all(isinstance(obj, cls) for obj in objects):
+            session.add_all(objects)
+            await session.flush()
+            return BulkResult(len(objects), 0)
+
+        columns = {attr.key for attr in cls.__mapper__.column_attrs}
+        # multi-row VALUES needs the same columns in all rows
+        groups: dict[tuple, dict] = {}
+        for obj in objects:
+            row = _get_row(obj, columns)
+            group = groups.setdefault(tuple(sorted(row)), {})
+            key = tuple(row[name] for name in conflict_columns) \
+                if on_conflict and conflict_columns else len(group)
+            if on_conflict is OnConflict.update or key not in group:
+                group[key] = row
 
+        dialect = session.bind.dialect.name
+        inserted = updated = 0
+        for names, group in groups.items():
+            rows = list(group.values())
+            size = max(1, min(batch_size, BULK_MAX_PARAMS // max(len(names), 1)))
+            for start in range(0, len(rows), size):
+                batch_inserted, batch_updated = await _insert_batch(
+                    session, cls, dialect, rows[start:start + size],
+                    on_conflict, conflict_columns, update_columns,
+                )
+                inserted += batch_inserted
+                updated += batch_updated
+        return BulkResult(inserted, updated)
 
     async def update(
         self,
@@ -79,15 +180,35 @@ class CRUDMixin(InspectionMixin):
         """
         Fetches the object if exists (filtering on the provided parameters),
         else creates an instance with any unspecified parameters as default values.
+
+        On postgresql, if the parameters contain a unique key of the model,
+        it's done by one INSERT ... ON CONFLICT statement (see _upsert).
+        Otherwise insert is done in a savepoint, and if a concurrent
+        transaction has inserted the object, it's fetched.
         """
         if defaults is None:
             defaults = {}
+        if _can_upsert(cls, session, kwargs, defaults):
+            result = await _upsert(cls, session, kwargs, defaults, update=False)
+            if result is not None:
+                return result
+
         try:
             instance = await cls.where(**kwargs).one(session)
             return instance, False
         except NoResultFound:
-            kwargs |= defaults or {}
-            return await cls.create(session, **kwargs), True
+            pass
+
+        try:
+            async with session.begin_nested():
+                instance = await cls.create(session, **(kwargs | defaults))
+            return instance, True
+        except IntegrityError:
+            # created by concurrent transaction
+            instance = await cls.where(**kwargs).one_or_none(session)
+            if instance is None:
+                raise
+            return instance, False
 
     @classmethod
     async def update_or_create(
@@ -99,17 +220,21 @@ class CRUDMixin(InspectionMixin):
         """
         A convenience method for updating an object with the given
         kwargs, creating a new one if necessary.
+
+        Like get_or_create, it's one INSERT ... ON CONFLICT DO UPDATE
+        statement, if possible.
         """
         if defaults is None:
             defaults = {}
-        try:
-            instance = await cls.where(**kwargs).one(session)
-        except NoResultFound:
-            kwargs |= defaults or {}
-            return await cls.create(session, **kwargs), True
-        else:
+        if _can_upsert(cls, session, kwargs, defaults):
+            result = await _upsert(cls, session, kwargs, defaults, update=True)
+            if result is not None:
+                return result
+
+        instance, created = await cls.get_or_create(session, defaults, **kwargs)
+        if not created:
             await instance.update(session, **defaults)
-            return instance, False
+        return instance, created
 
     @classmethod
     async def find(
@@ -144,6 +269,60 @@ class CRUDMixin(InspectionMixin):
         """
         return await session.get(cls, id)
 
+    @classmethod
+    async def find_many(
+        cls,
+        session: AsyncSession,
+        ids: Iterable[Any],
+        preserve_order: bool = True,
+        missing: Literal["skip", "raise", "none"] = "skip",
+        schema: Optional[dict] = None,
+    ) -> list[Optional[Model]]:
+        """
+        Find records by list of ids.
+
+        Records in the session identity map are taken from it (if relations
+        of the schema are loaded), others are fetched by one query
+        per FIND_MANY_CHUNK_SIZE ids.
+
+        Args:
+            ids: Primary keys
+            preserve_order: Return records in order of ids, otherwise
+                records of identity map go first
+            missing: Skip ids which are not found, raise NoResultFound
+                or return None in their places (in order of ids)
+            schema: Eager load schema, like in EagerLoadMixin.with_()
+
+        Raises: NoResultFound
+        """
+        ids = list(ids)
+        unique_ids = list(dict.fromkeys(ids))
+        flat_schema = _flatten_schema(schema) if schema else {}
+        found = {}
+        for id_ in unique_ids:
+            instance = _get_loaded(session, cls, id_, flat_schema)
+            if instance is not None:
+                found[id_] = instance
+
+        not_loaded = [id_ for id_ in unique_ids if id_ not in found]
+        for start in range(0, len(not_loaded), FIND_MANY_CHUNK_SIZE):
+            chunk = not_loaded[start:start + FIND_MANY_CHUNK_SIZE]
+            query = select(cls)\
+                .where(_pk_in(session, cls, chunk))\
+                .options(*eager_expr(schema or {}))
+            for instance in await query.all(session):
+                identity = inspect(instance).identity
+                found[identity[0] if len(identity) == 1 else identity] = instance
+
+        if missing == "raise" and len(found) < len(unique_ids):
+            not_found = [id_ for id_ in unique_ids if id_ not in found]
+            raise NoResultFound(f"No rows were found for ids: {not_found}")
+        if missing == "none":
+            return [found.get(id_) for id_ in ids]
+        if preserve_order:
+            return [found[id_] for id_ in ids if id_ in found]
+        return list(found.values())
+
     @classmethod
     async def exists(
         cls,
@@ -166,3 +345,217 @@ class CRUDMixin(InspectionMixin):
 
         """
         return await exists(cls.where(**fields)).select().scalar(session)
+
+
+def _get_row(obj: Union[Model, dict], columns: set[str]) -> dict:
+    if not isinstance(obj, dict):
+        return {name: obj.__dict__[name] for name in columns if name in obj.__dict__}
+
+    for name in obj:
+        if name not in columns:
+            raise KeyError("Attribute '{}' doesn't exist".format(name))
+    return obj
+
+
+async def _insert_batch(
+    session: AsyncSession,
+    model: Model,
+    dialect: str,
+    rows: list[dict],
+    on_conflict: Optional[OnConflict],
+    conflict_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]],
+) -> tuple[int, int]:
+    """Insert rows by one statement, returns counts of inserted and updated rows"""
+    table = model.__table__
+    if on_conflict is None:
+        result = await session.execute(insert(table).values(rows))
+        return result.rowcount, 0
+
+    if dialect not in _upsert_inserts:
+        raise NotImplementedError(f"ON CONFLICT isn't supported by {dialect}")
+    query = _upsert_inserts[dialect](table).values(rows)
+
+    if on_conflict is OnConflict.nothing:
+        query = query.on_conflict_do_nothing(index_elements=conflict_columns or None)
+    else:
+        if update_columns is None:
+            update_columns = [name for name in rows[0] if name not in conflict_columns]
+        values = {name: query.excluded[name] for name in update_columns}
+        # onupdate isn't applied to DO UPDATE, like updated_at = now()
+        for column in table.columns:
+            onupdate = column.onupdate
+            if onupdate is not None and column.key not in values \
+                    and (onupdate.is_clause_element or onupdate.is_scalar):
+                values[column.key] = onupdate.arg
+        query = query.on_conflict_do_update(
+            index_elements=conflict_columns, set_=values
+        )
+
+    if dialect == "postgresql":
+        # xmax of a just inserted row is 0
+        query = query.returning(literal_column("xmax = 0"))
+        flags = (await session.execute(query)).scalars().all()
+        return sum(flags), len(flags) - sum(flags)
+
+    existing = 0
+    if on_conflict is OnConflict.update:
+        keys = tuple_(*(table.c[name] for name in conflict_columns))
+        existing = await session.scalar(
+            select(func.count()).select_from(table).where(keys.in_([
+                tuple(row[name] for name in conflict_columns) for row in rows
+            ]))
+        )
+    result = await session.execute(query)
+    return result.rowcount - existing, existing
+
+
+def get_unique_keys(model: Model) -> list[tuple[str, ...]]:
+    """Column keys of primary key, unique constraints and unique indexes"""
+    table = model.__table__
+    keys = [
+        tuple(column.key for column in constraint.columns)
+        for constraint in table.constraints
+        if isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint))
+    ]
+    keys.extend(
+        tuple(column.key for column in index.columns)
+        for index in table.indexes
+        if index.unique
+    )
+    keys.extend((column.key,) for column in table.columns if column.unique)
+    return [key for key in keys if key]
+
+
+def _can_upsert(
+    model: Model,
+    session: AsyncSession,
+    kwargs: dict,
+    defaults: dict,
+) -> bool:
+    """
+    Model can be upserted, if it's postgresql, which returns rows of
+    INSERT ... ON CONFLICT, lookup contains a unique key, only columns are
+    given and create/update aren't overridden (like password hashing).
+    """
+    if session.bind.dialect.name != "postgresql":
+        return False
+    if getattr(model.create, "__func__", None) is not CRUDMixin.create.__func__ \
+            or model.update is not CRUDMixin.update:
+        return False
+
+    mapper = model.__mapper__
+    if any(rel.lazy in _EAGER_LOADS for rel in mapper.relationships):
+        return False
+    columns = {attr.key for attr in mapper.column_attrs}
+    if not columns.issuperset(kwargs) or not columns.issuperset(defaults):
+        return False
+    return _get_conflict_key(model, kwargs) is not None
+
+
+def _get_conflict_key(model: Model, kwargs: dict) -> Optional[tuple[str, ...]]:
+    for key in get_unique_keys(model):
+        if set(key).issubset(kwargs):
+            return key
+    return None
+
+
+async def _upsert(
+    model: Model,
+    session: AsyncSession,
+    kwargs: dict,
+    defaults: dict,
+    update: bool,
+) -> Optional[tuple[Model, bool]]:
+    """
+    Insert the row, or take existing one with the same unique key by
+    ON CONFLICT DO UPDATE, which updates defaults or, for get_or_create,
+    sets the key to itself, so the row is returned. It's safe for concurrent
+    calls: conflicting insert waits for the other transaction.
+
+    Returns None, if existing row differs from lookup by other parameters.
+    """
+    table = model.__table__
+    key = _get_conflict_key(model, kwargs)
+    query = postgresql.insert(table).values(**(kwargs | defaults))
+
+    values = {name: query.excluded[name] for name in defaults} if update else {}
+    if values:
+        for column in table.columns:
+            onupdate = column.onupdate
+            if onupdate is not None and column.key not in values \
+                    and (onupdate.is_clause_element or onupdate.is_scalar):
+                values[column.key] = onupdate.arg
+    else:
+        values = {name: query.excluded[name] for name in key}
+
+    # row with the same key, but other lookup values, isn't updated
+    # and returned
+    lookup = [
+        table.c[name] == value
+        for name, value in kwargs.items()
+        if name not in key
+    ]
+    query = query.on_conflict_do_update(
+        index_elements=key,
+        set_=values,
+        where=and_(*lookup) if lookup else None,
+    ).returning(*table.columns, literal_column("xmax = 0").label("created"))
+
+    result = await session.execute(
+        select(model, literal_column("created"))
+        .from_statement(query)
+        .execution_options(populate_existing=True)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+    instance, created = row
+    return instance, created
+
+
+def _get_loaded(
+    session: AsyncSession,
+    model: Model,
+    id_: Any,
+    flat_schema: dict,
+) -> Optional[Model]:
+    """Instance of the identity map, if it's loaded with relations of the schema"""
+    instance = session.sync_session.identity_map.get(identity_key(model, id_))
+    if instance is None:
+        return None
+    state = inspect(instance)
+    if state.expired or state.deleted:
+        return None
+    for path in flat_schema:
+        if not _is_loaded([instance], path.split(".")):
+            return None
+    return instance
+
+
+def _is_loaded(instances: list, path: list[str]) -> bool:
+    name, *rest = path
+    for instance in instances:
+        if name in inspect(instance).unloaded:
+            return False
+        if rest:
+            value = getattr(instance, name)
+            if value is None:
+                continue
+            related = list(value) if isinstance(value, (list, set)) else [value]
+            if not _is_loaded(related, rest):
+                return False
+    return True
+
+
+def _pk_in(session: AsyncSession, model: Model, ids: list):
+    pk = model.__mapper__.primary_key
+    if len(pk) > 1:
+        return tuple_(*pk).in_(ids)
+    if session.bind.dialect.name == "postgresql":
+        # one array parameter instead of a parameter per id,
+        # so the statement is the same for any count of ids
+        return pk[0] == any_(bindparam(
+            "ids", ids, type_=postgresql.ARRAY(pk[0].type)
+        ))
+    return pk[0].in_(ids)
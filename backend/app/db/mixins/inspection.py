@@ -1,68 +1,143 @@
-from sqlalchemy import inspect
+from types import MappingProxyType
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event, inspect
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
-from sqlalchemy.orm import RelationshipProperty
+from sqlalchemy.orm import Mapper, RelationshipProperty, configure_mappers
+from sqlalchemy.orm.util import AliasedClass
 
 from .utils import classproperty
 
 
+class InspectionMetadata:
+    """
+    Frozen inspection data of a mapped class.
+
+    It's computed once per class after mappers are configured
+    and is shared, so names are tuples and mappings are read-only.
+    """
+
+    def __init__(self, cls):
+        # backrefs are added to the mapper during configuration
+        configure_mappers()
+        mapper = inspect(cls)
+        descriptors = mapper.all_orm_descriptors
+
+        self.columns = tuple(mapper.columns.keys())
+        self.primary_keys_full = tuple(
+            mapper.get_property_by_column(column)
+            for column in mapper.primary_key
+        )
+        self.primary_keys = tuple(pk.key for pk in self.primary_keys_full)
+        self.relations = tuple(
+            c.key
+            for c in mapper.iterate_properties
+            if isinstance(c, RelationshipProperty)
+        )
+        self.settable_relations = tuple(
+            r
+            for r in self.relations
+            if mapper.relationships[r].viewonly is False
+        )
+        self.hybrid_properties = tuple(
+            item.__name__
+            for item in descriptors
+            if isinstance(item, hybrid_property)
+        )
+        self.hybrid_methods_full = MappingProxyType({
+            item.func.__name__: item
+            for item in descriptors
+            if isinstance(item, hybrid_method)
+        })
+        self.hybrid_methods = tuple(self.hybrid_methods_full.keys())
+
+        self.filterable_attributes = (
+            self.relations
+            + self.columns
+            + self.hybrid_properties
+            + self.hybrid_methods
+        )
+        self.sortable_attributes = self.columns + self.hybrid_properties
+        self.settable_attributes = (
+            self.columns + self.hybrid_properties + self.settable_relations
+        )
+
+        # for O(1) lookups
+        self.relations_set = frozenset(self.relations)
+        self.hybrid_methods_set = frozenset(self.hybrid_methods)
+        self.filterable_set = frozenset(self.filterable_attributes)
+        self.sortable_set = frozenset(self.sortable_attributes)
+        self.settable_set = frozenset(self.settable_attributes)
+
+        # parsed filter keys, filled by SmartQueryMixin
+        self.filter_keys: dict = {}
+
+
+_registry: WeakKeyDictionary = WeakKeyDictionary()
+
+
+@event.listens_for(Mapper, "instrument_class")
+def _new_mapper(mapper, cls):
+    """New mapper will add its backrefs on configuration"""
+    _registry.clear()
+
+
+@event.listens_for(Mapper, "after_configured")
+def _invalidate_registry():
+    """New mappers are configured, so relations could be changed"""
+    _registry.clear()
+
+
+def get_metadata(cls) -> InspectionMetadata:
+    if isinstance(cls, AliasedClass):
+        cls = inspect(cls).mapper.class_
+
+    metadata = _registry.get(cls)
+    if metadata is None:
+        metadata = _registry[cls] = InspectionMetadata(cls)
+    return metadata
+
+
 class InspectionMixin:
     __abstract__ = True
 
+    @classproperty
+    def _metadata(cls) -> InspectionMetadata:
+        return get_metadata(cls)
+
     @classproperty
     def columns(cls):
-        return inspect(cls).columns.keys()
+        return cls._metadata.columns
 
     @classproperty
     def primary_keys_full(cls):
         """Get primary key properties for a SQLAlchemy cls.
         Taken from marshmallow_sqlalchemy
         """
-        mapper = cls.__mapper__
-        return [
-            mapper.get_property_by_column(column)
-            for column in mapper.primary_key
-        ]
+        return cls._metadata.primary_keys_full
 
     @classproperty
     def primary_keys(cls):
-        return [pk.key for pk in cls.primary_keys_full]
+        return cls._metadata.primary_keys
 
     @classproperty
     def relations(cls):
-        """Return a `list` of relationship names or the given model"""
-        return [
-            c.key
-            for c in cls.__mapper__.iterate_properties
-            if isinstance(c, RelationshipProperty)
-        ]
+        """Return a `tuple` of relationship names or the given model"""
+        return cls._metadata.relations
 
     @classproperty
     def settable_relations(cls):
-        """Return a `list` of relationship names or the given model"""
-        return [
-            r
-            for r in cls.relations
-            if getattr(cls, r).property.viewonly is False
-        ]
+        """Return a `tuple` of relationship names or the given model"""
+        return cls._metadata.settable_relations
 
     @classproperty
     def hybrid_properties(cls):
-        items = inspect(cls).all_orm_descriptors
-        return [
-            item.__name__
-            for item in items
-            if isinstance(item, hybrid_property)
-        ]
+        return cls._metadata.hybrid_properties
 
     @classproperty
     def hybrid_methods_full(cls):
-        items = inspect(cls).all_orm_descriptors
-        return {
-            item.func.__name__: item
-            for item in items
-            if isinstance(item, hybrid_method)
-        }
+        return cls._metadata.hybrid_methods_full
 
     @classproperty
     def hybrid_methods(cls):
-        return list(cls.hybrid_methods_full.keys())
+        return cls._metadata.hybrid_methods
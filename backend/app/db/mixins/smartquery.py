@@ -1,8 +1,10 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, Optional, Sequence
 from collections import OrderedDict
+from datetime import date, datetime
+from functools import partial
 
-from sqlalchemy import asc, desc, inspect, select, not_
+from sqlalchemy import and_, asc, desc, false, inspect, not_, or_, select, tuple_
 from sqlalchemy.orm import aliased, contains_eager
 from sqlalchemy.orm.util import AliasedClass
 from sqlalchemy.sql import extract, operators, Select
@@ -13,7 +15,7 @@ from .eagerload import (
     _eager_expr_from_flat_schema,
     _flatten_schema,
 )
-from .inspection import InspectionMixin
+from .inspection import InspectionMixin, get_metadata
 from .utils import classproperty
 
 if TYPE_CHECKING:
@@ -24,6 +26,74 @@ OPERATOR_SPLITTER = "__"
 
 DESC_PREFIX = "-"
 
+QUERY_CACHE_SIZE = 512
+
+# execution option of query, which looks up an instance by primary key
+IDENTITY_OPTION = "identity"
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class QueryCache:
+    """
+    LRU cache of smart queries.
+
+    Stores a query prepared for the shape (root class, filter keys,
+    sort attrs and eager load schema): joins, aliases, sorting and eager
+    loading. So only filter values have to be bound to it on each call,
+    and since aliases are reused, the statement keeps the same cache key
+    in SQLAlchemy compiled cache.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._queries: OrderedDict = OrderedDict()
+
+    def get(self, shape: tuple) -> Optional[PreparedQuery]:
+        prepared = self._queries.get(shape)
+        if prepared is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._queries.move_to_end(shape)
+        return prepared
+
+    def set(self, shape: tuple, prepared: PreparedQuery) -> None:
+        self._queries[shape] = prepared
+        if len(self._queries) > self.maxsize:
+            self._queries.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._queries))
+
+    def clear(self) -> None:
+        self.hits = self.misses = 0
+        self._queries.clear()
+
+
+class PreparedQuery(NamedTuple):
+    query: Select
+    # compiled filter for every filter key (see compile_filter)
+    filters: tuple
+
+    def bind(self, filters: dict) -> Select:
+        if not filters:
+            return self.query
+        return self.query.filter(*(
+            compiled(value)
+            for compiled, value in zip(self.filters, filters.values())
+        ))
+
+
+query_cache = QueryCache()
+
 
 def _parse_path_and_make_aliases(
     entity: InspectionMixin,
@@ -55,7 +125,7 @@ def _parse_path_and_make_aliases(
             if entity_path
             else relation_name
         )
-        if relation_name not in entity.relations:
+        if relation_name not in get_metadata(entity).relations_set:
             raise KeyError(
                 "Incorrect path `{}`: "
                 "{} doesnt have `{}` relationship ".format(path, entity, relation_name)
@@ -66,6 +136,17 @@ def _parse_path_and_make_aliases(
         _parse_path_and_make_aliases(alias, path, nested_attrs, aliases)
 
 
+def _get_pk_identity(root_cls: Model, filters: dict) -> Optional[tuple]:
+    """Model and primary key, if filters are just equality of primary key"""
+    if len(filters) != 1 or len(root_cls.primary_keys) != 1:
+        return None
+    ((attr, value),) = filters.items()
+    pk = root_cls.primary_keys[0]
+    if value is None or attr not in (pk, pk + OPERATOR_SPLITTER + "exact"):
+        return None
+    return root_cls, value
+
+
 def smart_query(
     root_cls: Model,
     filters: dict = None,
@@ -80,20 +161,53 @@ def smart_query(
     And if, say, filters and sorting need the same joinm it will be done
      only one. That's why all stuff is combined in single method
 
+    Query prepared for the given shape is cached (see QueryCache)
+     if it's built from scratch, so only filter values are bound
+     on next calls.
+
     Args:
         root_cls ([type]): For example, User or Post
         filters (dict, optional): Defaults to None.
         sort_attrs (list[str], optional): Defaults to None.
         schema (dict, optional): Defaults to None.
     """
-    if query is None:
-        query = select(root_cls)
-
     if not filters:
         filters = {}
     if not sort_attrs:
         sort_attrs = []
 
+    if query is not None:
+        return _prepare_smart_query(
+            root_cls, filters, sort_attrs, schema, query
+        ).bind(filters)
+
+    flat_schema = _flatten_schema(schema) if schema else {}
+    shape = (
+        root_cls,
+        tuple(filters),
+        tuple(sort_attrs),
+        tuple(flat_schema.items()),
+    )
+    prepared = query_cache.get(shape)
+    if prepared is not None:
+        return prepared.bind(filters)
+
+    prepared = _prepare_smart_query(root_cls, filters, sort_attrs, schema)
+    query_cache.set(shape, prepared)
+    return prepared.bind(filters)
+
+
+def _prepare_smart_query(
+    root_cls: Model,
+    filters: dict,
+    sort_attrs: list[str],
+    schema: dict = None,
+    query: Select = None,
+) -> PreparedQuery:
+    """Make joins, sorting and eager loading, but don't apply filters"""
+    if query is None:
+        query = select(root_cls)
+
     # Load schema early since we need it to check
     # whether we should eager load a relationship
     if schema:
@@ -119,14 +233,15 @@ def smart_query(
             )
             loaded_paths.append(relationship_path)
 
-    for attr, value in filters.items():
+    compiled_filters = []
+    for attr in filters:
         if RELATION_SPLITTER in attr:
             parts = attr.rsplit(RELATION_SPLITTER, 1)
             entity, attr_name = aliases[parts[0]][0], parts[1]
         else:
             entity, attr_name = root_cls, attr
         try:
-            query = query.filter(*entity.filter_expr(**{attr_name: value}))
+            compiled_filters.append(entity.compile_filter(attr_name))
         except KeyError as e:
             raise KeyError("Incorrect filter path `{}`: {}".format(attr, e))
 
@@ -151,7 +266,54 @@ def smart_query(
         }
         query = query.options(*_eager_expr_from_flat_schema(not_loaded_part))
 
-    return query
+    return PreparedQuery(query, tuple(compiled_filters))
+
+
+def _is_nullable(attr: Any) -> bool:
+    columns = getattr(getattr(attr, "property", None), "columns", None)
+    # hybrid properties can be anything
+    return not columns or any(column.nullable for column in columns)
+
+
+def _coerce_to_column_type(attr: Any, value: Any) -> Any:
+    try:
+        python_type = attr.type.python_type
+    except (AttributeError, NotImplementedError):
+        return value
+
+    if value is None or isinstance(value, python_type):
+        return value
+    if issubclass(python_type, (datetime, date)):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def _after(column: Any, is_desc: bool, value: Any) -> Any:
+    """Condition of column value going after the value in sort order"""
+    nullable = _is_nullable(column)
+    if is_desc:
+        # NULLs go first
+        if value is None:
+            return column.isnot(None)
+        return column < value
+
+    # NULLs go last
+    if value is None:
+        return false()
+    if nullable:
+        return or_(column > value, column.is_(None))
+    return column > value
+
+
+def _compile_filter(
+    mapper: InspectionMixin,
+    cls: SmartQueryMixin,
+    attr: str,
+) -> Callable[[Any], Any]:
+    attr_name, op = cls._parse_filter_key(attr)
+    if op is None:
+        return partial(getattr(cls, attr_name), mapper=mapper)
+    return partial(op, getattr(mapper, attr_name))
 
 
 class SmartQueryMixin(InspectionMixin, EagerLoadMixin):
@@ -197,15 +359,15 @@ class SmartQueryMixin(InspectionMixin, EagerLoadMixin):
     }
 
     @classproperty
-    def filterable_attributes(cls) -> list:
-        return cls.relations + cls.columns + cls.hybrid_properties + cls.hybrid_methods
+    def filterable_attributes(cls) -> tuple:
+        return cls._metadata.filterable_attributes
 
     @classproperty
-    def sortable_attributes(cls) -> list:
-        return cls.columns + cls.hybrid_properties
+    def sortable_attributes(cls) -> tuple:
+        return cls._metadata.sortable_attributes
 
     @classmethod
-    def filter_expr(cls_or_alias, **filters):
+    def filter_expr(cls_or_alias, *specs: dict, **filters):
         """
         forms expressions like [Product.age_from = 5,
                                 Product.subject_ids.in_([1,2])]
@@ -219,6 +381,10 @@ class SmartQueryMixin(InspectionMixin, EagerLoadMixin):
             filters = {'age_from': 5, 'subject_ids__in': [1,2]}
             select(Product).filter(*Product.filter_expr(**filters))
 
+        Example 3 (batch of filter specs, say, from API):
+            specs = [{'age_from': 5}, {'subject_ids__in': [1,2]}]
+            select(Product).filter(*Product.filter_expr(*specs))
+
 
         ### About alias ###:
         If we will use alias:
@@ -262,39 +428,67 @@ class SmartQueryMixin(InspectionMixin, EagerLoadMixin):
             mapper = cls = cls_or_alias
 
         expressions = []
-        valid_attributes = cls.filterable_attributes
-        for attr, value in filters.items():
-            # if attribute is filtered by method, call this method
-            if attr in cls.hybrid_methods:
-                method = getattr(cls, attr)
-                expressions.append(method(value, mapper=mapper))
-            # else just add simple condition (== for scalars or IN for lists)
-            else:
-                # determine attrbitute name and operator
-                # if they are explicitly set (say, id___between), take them
-                if OPERATOR_SPLITTER in attr:
-                    attr_name, op_name = attr.rsplit(OPERATOR_SPLITTER, 1)
-                    if op_name not in cls._operators:
-                        raise KeyError(
-                            "Expression `{}` has incorrect "
-                            "operator `{}`".format(attr, op_name)
-                        )
-                    op = cls._operators[op_name]
-                # assume equality operator for other cases (say, id=1)
-                else:
-                    attr_name, op = attr, operators.eq
-
-                if attr_name not in valid_attributes:
-                    raise KeyError(
-                        "Expression `{}` "
-                        "has incorrect attribute `{}`".format(attr, attr_name)
-                    )
-
-                column = getattr(mapper, attr_name)
-                expressions.append(op(column, value))
+        for spec in (*specs, filters):
+            for attr, value in spec.items():
+                expressions.append(_compile_filter(mapper, cls, attr)(value))
 
         return expressions
 
+    @classmethod
+    def compile_filter(cls_or_alias, attr: str) -> Callable[[Any], Any]:
+        """
+        Returns a function which forms expression for the given filter key
+         from a value, like filter_expr() does.
+
+        Example:
+            rating_gt = Comment.compile_filter('rating__gt')
+            select(Comment).filter(rating_gt(2))
+        """
+        if isinstance(cls_or_alias, AliasedClass):
+            mapper, cls = cls_or_alias, inspect(cls_or_alias).mapper.class_
+        else:
+            mapper = cls = cls_or_alias
+        return _compile_filter(mapper, cls, attr)
+
+    @classmethod
+    def _parse_filter_key(cls, attr: str) -> tuple[str, Optional[Callable]]:
+        """
+        Splits filter key like `subject_ids__in` to attribute name
+         and operator. Operator is None for hybrid methods.
+
+        Correct keys are cached per class, so it's done once for every key.
+        """
+        metadata = cls._metadata
+        parsed = metadata.filter_keys.get(attr)
+        if parsed is not None:
+            return parsed
+
+        # if attribute is filtered by method, it will be called
+        if attr in metadata.hybrid_methods_set:
+            parsed = attr, None
+        # determine attrbitute name and operator
+        # if they are explicitly set (say, id___between), take them
+        elif OPERATOR_SPLITTER in attr:
+            attr_name, op_name = attr.rsplit(OPERATOR_SPLITTER, 1)
+            if op_name not in cls._operators:
+                raise KeyError(
+                    "Expression `{}` has incorrect "
+                    "operator `{}`".format(attr, op_name)
+                )
+            parsed = attr_name, cls._operators[op_name]
+        # assume equality operator for other cases (say, id=1)
+        else:
+            parsed = attr, operators.eq
+
+        if parsed[1] is not None and parsed[0] not in metadata.filterable_set:
+            raise KeyError(
+                "Expression `{}` "
+                "has incorrect attribute `{}`".format(attr, parsed[0])
+            )
+
+        metadata.filter_keys[attr] = parsed
+        return parsed
+
     @classmethod
     def order_expr(cls_or_alias, *columns):
         """
@@ -318,15 +512,90 @@ class SmartQueryMixin(InspectionMixin, EagerLoadMixin):
             mapper = cls = cls_or_alias
 
         expressions = []
+        sortable = cls._metadata.sortable_set
         for attr in columns:
             fn, attr = (desc, attr[1:]) if attr.startswith(DESC_PREFIX) else (asc, attr)
-            if attr not in cls.sortable_attributes:
+            if attr not in sortable:
                 raise KeyError("Cant order {} by {}".format(cls, attr))
 
             expr = fn(getattr(mapper, attr))
             expressions.append(expr)
         return expressions
 
+    @classmethod
+    def keyset_columns(cls, *columns: str) -> list[str]:
+        """
+        Makes sort columns unique together for keyset pagination:
+          appends primary keys in direction of the last column
+          unless they are already there.
+
+        Example:
+          User.keyset_columns('-created_at')  # ['-created_at', '-id']
+        """
+        sorted_attrs = {attr.lstrip(DESC_PREFIX) for attr in columns}
+        prefix = ""
+        if columns and columns[-1].startswith(DESC_PREFIX):
+            prefix = DESC_PREFIX
+        return list(columns) + [
+            prefix + pk for pk in cls.primary_keys if pk not in sorted_attrs
+        ]
+
+    @classmethod
+    def seek_expr(cls_or_alias, columns: Sequence[str], values: Sequence) -> list:
+        """
+        Forms keyset (seek) pagination expression which selects rows going
+          after the row with given values of sort columns,
+          like (created_at, id) > ('2021-07-01', 10)
+
+        Columns must be unique together (see keyset_columns). NULLs are
+          expected to be sorted like PostgreSQL does: last in ascending order.
+          Values of strings (say, from JSON) are coerced to column types.
+
+        Example:
+          columns = User.keyset_columns('-created_at')
+          stmt = (
+              select(User)
+              .filter(*User.seek_expr(columns, [last.created_at, last.id]))
+              .order_by(*User.order_expr(*columns))
+              .limit(20)
+          )
+
+        About cls_or_alias, mapper, cls: read in filter_expr method description
+        """
+        if isinstance(cls_or_alias, AliasedClass):
+            mapper, cls = cls_or_alias, inspect(cls_or_alias).mapper.class_
+        else:
+            mapper = cls = cls_or_alias
+
+        if len(columns) != len(values):
+            raise ValueError("Count of values doesn't match count of columns")
+
+        keys = []
+        sortable = cls._metadata.sortable_set
+        for attr, value in zip(columns, values):
+            is_desc, attr = attr.startswith(DESC_PREFIX), attr.lstrip(DESC_PREFIX)
+            if attr not in sortable:
+                raise KeyError("Cant seek {} by {}".format(cls, attr))
+            column = getattr(mapper, attr)
+            keys.append((column, is_desc, _coerce_to_column_type(column, value)))
+
+        # row values comparison is done in a single index seek
+        directions = {is_desc for _, is_desc, _ in keys}
+        if len(directions) == 1 and not any(
+            value is None or _is_nullable(column) for column, _, value in keys
+        ):
+            left = tuple_(*(column for column, _, _ in keys))
+            right = tuple_(*(value for _, _, value in keys))
+            return [left < right if directions.pop() else left > right]
+
+        # (c1 after v1) or (c1 = v1 and c2 after v2) or ...
+        conditions = []
+        equals: list = []
+        for column, is_desc, value in keys:
+            conditions.append(and_(*equals, _after(column, is_desc, value)))
+            equals.append(column.is_(None) if value is None else column == value)
+        return [or_(*conditions)]
+
     @classmethod
     def smart_query(
         cls,
@@ -357,8 +626,16 @@ class SmartQueryMixin(InspectionMixin, EagerLoadMixin):
 
         Example 3 (with joins):
           Post.where(public=True, user___name__startswith='Bi').all()
+
+        Lookup by primary key, like Post.where(id=1).one(db), takes
+        the instance from the session identity map, if it's there
+        (see db.orm.utils.get_identity).
         """
-        return cls.smart_query(filters)
+        query = cls.smart_query(filters)
+        identity = _get_pk_identity(cls, filters)
+        if identity is not None:
+            query = query.execution_options(**{IDENTITY_OPTION: identity})
+        return query
 
     @classmethod
     def sort(cls, *columns):
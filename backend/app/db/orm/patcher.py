@@ -4,6 +4,7 @@ from sqlalchemy.sql import Delete, Insert, Select, Update
 from sqlalchemy.sql.selectable import Exists
 
 from . import result
+from .utils import bind_result_accessor
 
 
 select_methods_names = [
@@ -12,6 +13,8 @@ select_methods_names = [
     "count",
     "with_joined",
     "with_subquery",
+    "update_all",
+    "delete_all",
 ]
 
 
@@ -24,11 +27,22 @@ def patch_sqlalchemy_crud():
         Exists,
     )
 
+    methods = {
+        name: func
+        for name, func in result.__dict__.items()
+        if isfunction(func) and func.__module__ == result.__name__
+    }
+
+    # Bind result accessors once, so terminal methods
+    # don't resolve them on every call
+    for name, accessor in result.terminal_accessors.items():
+        methods[name] = bind_result_accessor(methods[name], accessor)
+
     # Patch all
     result_methods = {
         name: func
-        for name, func in result.__dict__.items()
-        if isfunction(func) and name not in select_methods_names
+        for name, func in methods.items()
+        if name not in select_methods_names
     }
 
     for name, method in result_methods.items():
@@ -38,8 +52,8 @@ def patch_sqlalchemy_crud():
     # Patch select
     select_methods = {
         name: func
-        for name, func in result.__dict__.items()
-        if isfunction(func) and name in select_methods_names
+        for name, func in methods.items()
+        if name in select_methods_names
     }
 
     for name, method in select_methods.items():
@@ -1,7 +1,7 @@
 # type: ignore
 
 from __future__ import annotations
-from typing import Optional, Mapping, Any, TYPE_CHECKING
+from typing import Optional, Mapping, Any, Union, TYPE_CHECKING
 
 import sqlalchemy as sa
 from sqlalchemy.sql import Select
@@ -10,13 +10,35 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.engine.row import Row
 
 from extra.types import Paths
-from db.orm.utils import async_call, get_model_from_query
+from db.orm.utils import (
+    ResultAccessor,
+    async_call,
+    execute_dml,
+    get_by_identity,
+    get_dml_criteria,
+    get_identity,
+    get_model_from_query,
+    result_accessor,
+)
 from db.mixins.smartquery import smart_query
 
 if TYPE_CHECKING:
     from db.model import Model
 
 
+# Result accessors of terminal methods, they are bound
+# to the methods by patcher.
+terminal_accessors: dict[str, ResultAccessor] = {
+    "unique": result_accessor("unique"),
+    "one": result_accessor("scalar_one"),
+    "one_or_none": result_accessor("scalar_one_or_none"),
+    "scalar": result_accessor("scalar"),
+    "first": result_accessor("scalar"),
+    "scalars": result_accessor("scalars"),
+    "all": result_accessor("scalars", "all"),
+}
+
+
 def only(self, *columns: str) -> Select:
     """Shortcut for load only specific columns."""
     return self.options(load_only(*columns))
@@ -109,6 +131,54 @@ async def exists(self, session: AsyncSession) -> bool:
     return await sa.exists(self).select().scalar(session)
 
 
+async def update_all(
+    self,
+    session: AsyncSession,
+    synchronize_session: Union[str, bool, None] = None,
+    **values: Any,
+) -> int:
+    """
+    Update rows selected by the query with one UPDATE statement, without
+    loading them. Returns count of updated rows.
+
+    Filters on relations are applied by subquery of primary keys.
+
+    synchronize_session is a strategy of updating instances loaded
+    in the session: "evaluate", "fetch" or False (see SQLAlchemy docs).
+    By default it's "evaluate", or "fetch" if filters can't be evaluated
+    in Python (like filters on relations or by patterns).
+
+    Example:
+        await Account.where(email__like='%@old.com').update_all(db, fullname=None)
+    """
+    query_model, criteria, evaluable = get_dml_criteria(self)
+    query = sa.update(query_model).values(**values)
+    return await execute_dml(
+        session, query, criteria, evaluable, synchronize_session
+    )
+
+
+async def delete_all(
+    self,
+    session: AsyncSession,
+    synchronize_session: Union[str, bool, None] = None,
+) -> int:
+    """
+    Delete rows selected by the query with one DELETE statement, without
+    loading them. Returns count of deleted rows.
+
+    See update_all() about filters on relations and synchronize_session.
+
+    Example:
+        await Post.where(user___name='Bill').delete_all(db)
+    """
+    query_model, criteria, evaluable = get_dml_criteria(self)
+    query = sa.delete(query_model)
+    return await execute_dml(
+        session, query, criteria, evaluable, synchronize_session
+    )
+
+
 async def execute(
     self,
     session: AsyncSession,
@@ -120,15 +190,17 @@ async def execute(
 
 async def unique(
     self,
+    accessor: ResultAccessor,
     session: AsyncSession = None,
     parameters: Optional[Mapping] = None,
     execution_options: Mapping = sa.util.EMPTY_DICT,
 ) -> Optional[Row]:
-    return await async_call(self, session, parameters, execution_options)
+    return await async_call(self, session, accessor, parameters, execution_options)
 
 
 async def one(
     self,
+    accessor: ResultAccessor,
     session: AsyncSession = None,
     parameters: Optional[Mapping] = None,
     execution_options: Mapping = sa.util.EMPTY_DICT,
@@ -145,11 +217,15 @@ async def one(
         :meth:`_asyncio.AsyncResult.scalars`
 
     """
-    return await async_call(self, session, 'scalar_one', parameters, execution_options)
+    identity = get_identity(self, execution_options)
+    if identity is not None:
+        return await get_by_identity(session, identity, required=True)
+    return await async_call(self, session, accessor, parameters, execution_options)
 
 
 async def one_or_none(
     self,
+    accessor: ResultAccessor,
     session: AsyncSession = None,
     parameters: Optional[Mapping] = None,
     execution_options: Mapping = sa.util.EMPTY_DICT,
@@ -166,11 +242,15 @@ async def one_or_none(
         :meth:`_asyncio.AsyncResult.scalars`
 
     """
-    return await async_call(self, session, 'scalar_one_or_none', parameters, execution_options)
+    identity = get_identity(self, execution_options)
+    if identity is not None:
+        return await get_by_identity(session, identity, required=False)
+    return await async_call(self, session, accessor, parameters, execution_options)
 
 
 async def scalar(
     self,
+    accessor: ResultAccessor,
     session: AsyncSession = None,
     parameters: Optional[Mapping] = None,
     execution_options: Mapping = sa.util.EMPTY_DICT,
@@ -188,11 +268,12 @@ async def scalar(
     :return: a Python scalar value , or None if no rows remain.
 
     """
-    return await async_call(self, session, parameters, execution_options)
+    return await async_call(self, session, accessor, parameters, execution_options)
 
 
 async def first(
     self,
+    accessor: ResultAccessor,
     session: AsyncSession = None,
     parameters: Optional[Mapping] = None,
     execution_options: Mapping = sa.util.EMPTY_DICT,
@@ -210,26 +291,24 @@ async def first(
     :return: a Python scalar value , or None if no rows remain.
 
     """
-    return await async_call(self, session, 'scalar', parameters, execution_options)
+    return await async_call(self, session, accessor, parameters, execution_options)
 
 
 async def scalars(
     self,
+    accessor: ResultAccessor,
     session: AsyncSession = None,
     parameters: Optional[Mapping] = None,
     execution_options: Mapping = sa.util.EMPTY_DICT,
 ) -> Any:
-    return await async_call(self, session, parameters, execution_options)
+    return await async_call(self, session, accessor, parameters, execution_options)
 
 
 async def all(
     self,
+    accessor: ResultAccessor,
     session: AsyncSession = None,
     parameters: Optional[Mapping] = None,
     execution_options: Mapping = sa.util.EMPTY_DICT,
 ) -> list[Model]:
-    return (
-        await async_call(
-            self, session, "scalars", parameters, execution_options
-        )
-    ).all()
+    return await async_call(self, session, accessor, parameters, execution_options)
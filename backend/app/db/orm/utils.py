@@ -1,43 +1,221 @@
-import inspect
-from typing import Mapping, Optional, Union, no_type_check
+from functools import wraps
+from operator import methodcaller
+from typing import Any, Callable, Mapping, Optional, Union, no_type_check
 
-from sqlalchemy import util
-from sqlalchemy.sql import Select
+from sqlalchemy import event, inspect, tuple_, util
+from sqlalchemy.exc import InvalidRequestError, NoResultFound
+from sqlalchemy.orm import Mapper, aliased
+from sqlalchemy.orm.util import AliasedClass
+from sqlalchemy.sql import (
+    Alias,
+    ClauseElement,
+    Delete,
+    FromClause,
+    Join,
+    Select,
+    Update,
+)
+from sqlalchemy.engine import Result
 from sqlalchemy.engine.row import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.model import Model
+from db.mixins.smartquery import IDENTITY_OPTION
 from extra.types import QueryType
 
 
+ResultAccessor = Callable[[Result], Any]
+
+
+def result_accessor(*method_names: str) -> ResultAccessor:
+    """
+    Build a callable which fetches rows from the result.
+
+    Example:
+        result_accessor("scalars", "all")   # result.scalars().all()
+    """
+    callers = [methodcaller(name) for name in method_names]
+    if len(callers) == 1:
+        return callers[0]
+
+    def accessor(result: Result) -> Any:
+        for caller in callers:
+            result = caller(result)
+        return result
+
+    return accessor
+
+
 @no_type_check
 async def async_call(
     query: QueryType,
     session: AsyncSession,
-    method_name: str = "",
+    accessor: ResultAccessor,
     parameters: Optional[Mapping] = None,
     execution_options: Mapping = util.EMPTY_DICT,
 ) -> Union[Model, Row, list[Row]]:
     result = await session.execute(query, parameters, execution_options)
-    result = result.unique()
+    return accessor(result.unique())
 
-    method_name = method_name if method_name else inspect.stack()[1][3]
-    if row_method := getattr(result, method_name, None):
-        return row_method()
 
-    raise Exception("Invalid method name.")
+def get_identity(
+    query: QueryType,
+    execution_options: Mapping = util.EMPTY_DICT,
+) -> Optional[tuple[Model, Any]]:
+    """
+    Model and primary key of the query made by where(id=...),
+    if the query is still a plain lookup by primary key: nothing
+    is filtered, joined or loaded in addition, and only the model
+    is selected.
+    """
+    options = query.get_execution_options()
+    identity = options.get(IDENTITY_OPTION)
+    if identity is None \
+            or options.get("populate_existing") \
+            or execution_options.get("populate_existing"):
+        return None
 
+    if len(query._where_criteria) != 1 \
+            or query._with_options \
+            or query._setup_joins \
+            or query._limit_clause is not None \
+            or query._offset_clause is not None \
+            or query._for_update_arg is not None:
+        return None
 
-def get_model_from_query(query: Select) -> Model:
-    table = query.froms[0]
-    models = Model.registry._class_registry.values()
+    descriptions = query.column_descriptions
+    if len(descriptions) != 1 or descriptions[0]["expr"] is not identity[0]:
+        return None
+    return identity
 
-    for model in models:
-        try:
-            if model.__tablename__ == table.name:
-                return model
-        except AttributeError:
-            # not table model
-            continue
 
-    raise Exception(f"Table model {table.name} not found in query.")
+async def get_by_identity(
+    session: AsyncSession,
+    identity: tuple[Model, Any],
+    required: bool = False,
+) -> Optional[Model]:
+    """
+    Get instance by primary key with session.get(), so the session
+    identity map is checked before going to DB.
+    """
+    instance = await session.get(*identity)
+    if instance is None and required:
+        raise NoResultFound("No row was found when one was required")
+    return instance
+
+
+def get_dml_criteria(
+    query: Select,
+) -> tuple[Union[Model, AliasedClass], Optional[ClauseElement], bool]:
+    """
+    Model and criteria of UPDATE/DELETE for rows selected by the query,
+    and whether the criteria can be evaluated in Python.
+
+    Query with joins, limit or offset is applied by a subquery
+    of primary keys.
+    """
+    query_model = query.column_descriptions[0]["entity"]
+    has_joins = any(isinstance(from_, Join) for from_ in query.froms)
+    if not has_joins \
+            and query._limit_clause is None \
+            and query._offset_clause is None:
+        return query_model, query.whereclause, True
+
+    pk = inspect(query_model).mapper.primary_key
+    column = pk[0] if len(pk) == 1 else tuple_(*pk)
+    ids = query.with_only_columns(*pk)
+    if query._limit_clause is None:
+        ids = ids.order_by(None)
+    return query_model, column.in_(ids), False
+
+
+async def execute_dml(
+    session: AsyncSession,
+    query: Union[Update, Delete],
+    criteria: Optional[ClauseElement],
+    evaluable: bool,
+    synchronize_session: Union[str, bool, None] = None,
+) -> int:
+    """Execute UPDATE/DELETE, returns count of affected rows"""
+    if criteria is not None:
+        query = query.where(criteria)
+    if synchronize_session is not None:
+        evaluable = False
+    else:
+        synchronize_session = "evaluate" if evaluable else "fetch"
+
+    try:
+        result = await session.execute(
+            query.execution_options(synchronize_session=synchronize_session)
+        )
+    except InvalidRequestError:
+        if not evaluable:
+            raise
+        # some operators (like, ilike, ...) can't be evaluated in Python,
+        # it's found out before the statement is executed
+        result = await session.execute(
+            query.execution_options(synchronize_session="fetch")
+        )
+    return result.rowcount
+
+
+def bind_result_accessor(method: Callable, accessor: ResultAccessor) -> Callable:
+    """
+    Bind result accessor to the terminal method once, at patch time,
+    so the method doesn't have to resolve it on every call.
+    """
+    @wraps(method)
+    def terminal_method(self, *args: Any, **kwargs: Any) -> Any:
+        return method(self, accessor, *args, **kwargs)
+
+    return terminal_method
+
+
+_table_models: dict[FromClause, list[Mapper]] = {}
+
+
+@event.listens_for(Mapper, "after_configured")
+def _invalidate_table_models():
+    _table_models.clear()
+
+
+def _build_table_models() -> None:
+    for mapper in Model.registry.mappers:
+        _table_models.setdefault(mapper.local_table, []).append(mapper)
+
+    for table, mappers in _table_models.items():
+        # single table inheritance: take the base mapper
+        bases = [m for m in mappers if m.inherits not in mappers]
+        if len(bases) == 1:
+            _table_models[table] = bases
+
+
+def get_model_from_table(table: FromClause) -> Model:
+    if not _table_models:
+        _build_table_models()
+
+    mappers = _table_models.get(table)
+    if not mappers:
+        raise InvalidRequestError(f"Table model {table.name} not found in query.")
+    if len(mappers) > 1:
+        models = ", ".join(m.class_.__name__ for m in mappers)
+        raise InvalidRequestError(
+            f"Table {table.name} is ambiguous, it's mapped by: {models}."
+        )
+    return mappers[0].class_
+
+
+def get_model_from_query(query: Select) -> Union[Model, AliasedClass]:
+    """
+    Get model of the first entity in the query.
+
+    If the entity is aliased, alias of the model is returned.
+    """
+    table = query.froms[0]
+    # joins (including ones made by joined eager loading)
+    while isinstance(table, Join):
+        table = table.left
+
+    if isinstance(table, Alias):
+        return aliased(get_model_from_table(table.element), table)
+    return get_model_from_table(table)
@@ -0,0 +1,115 @@
+import os
+import time
+from collections import defaultdict
+from typing import Any, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class WaitStats:
+    """Time of getting connections from pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total = 0.0
+        self.max = 0.0
+        # failed connections to database
+        self.failures = 0
+        self.last_failure_at: Optional[float] = None
+
+    def add(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+class HoldStats:
+    """Time of holding connections by sessions of one endpoint"""
+
+    def __init__(self):
+        self.holds = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.holds += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+# endpoint -> stats, filled by sessions with label (see db.sessions)
+hold_stats: defaultdict[str, HoldStats] = defaultdict(HoldStats)
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool, which measures time of waiting for connections
+    and counts connection failures.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = WaitStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.wait_stats.timeouts += 1
+            raise
+        except Exception:
+            self.wait_stats.failures += 1
+            self.wait_stats.last_failure_at = time.monotonic()
+            raise
+        finally:
+            self.wait_stats.add(time.perf_counter() - started)
+
+
+def get_pool_stats(engine: AsyncEngine) -> dict:
+    """Stats of the engine pool in the current worker"""
+    pool: Pool = engine.sync_engine.pool
+    stats: dict[str, Any] = dict(
+        pid=os.getpid(),
+        pool=pool.__class__.__name__,
+        size=None,
+        checked_in=None,
+        checked_out=None,
+        overflow=None,
+    )
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            # negative overflow means connections are not opened yet
+            overflow=max(pool.overflow(), 0),
+        )
+    if isinstance(pool, MeasuredQueuePool):
+        wait = pool.wait_stats
+        stats.update(
+            checkouts=wait.checkouts,
+            timeouts=wait.timeouts,
+            failures=wait.failures,
+            wait_time_total=wait.total,
+            wait_time_max=wait.max,
+            wait_time_avg=wait.total / wait.checkouts if wait.checkouts else 0.0,
+        )
+    return stats
+
+
+def get_hold_stats() -> list[dict]:
+    """Time of holding connections per endpoint in the current worker"""
+    return [
+        dict(
+            endpoint=endpoint,
+            holds=stats.holds,
+            hold_time_total=stats.total,
+            hold_time_max=stats.max,
+            hold_time_avg=stats.total / stats.holds,
+        )
+        for endpoint, stats in sorted(hold_stats.items())
+    ]
@@ -0,0 +1,71 @@
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from extra.enums import ReplicaSelection
+
+
+class ReplicaSet:
+    """
+    Replica engines for read-only sessions.
+
+    Replica is selected by round-robin or by the least count of checked out
+    connections. Replicas failed to connect (see MeasuredQueuePool) are skipped
+    for retry_after seconds, and if there is no replica to select,
+    None is returned to use primary.
+    """
+
+    def __init__(
+        self,
+        engines: list[AsyncEngine],
+        selection: ReplicaSelection = ReplicaSelection.round_robin,
+        retry_after: float = 30,
+    ):
+        self.engines = engines
+        self.selection = selection
+        self.retry_after = retry_after
+        self._next = 0
+
+    def is_available(self, engine: AsyncEngine) -> bool:
+        stats = getattr(engine.sync_engine.pool, "wait_stats", None)
+        if stats is None or stats.last_failure_at is None:
+            return True
+        return time.monotonic() - stats.last_failure_at >= self.retry_after
+
+    def select(self) -> Optional[AsyncEngine]:
+        engines = [e for e in self.engines if self.is_available(e)]
+        if not engines:
+            return None
+
+        if self.selection is ReplicaSelection.least_connections:
+            return min(engines, key=_checked_out)
+
+        self._next += 1
+        return engines[self._next % len(engines)]
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+def _checked_out(engine: AsyncEngine) -> int:
+    checkedout = getattr(engine.sync_engine.pool, "checkedout", None)
+    return checkedout() if checkedout else 0
+
+
+@event.listens_for(Session, "before_flush")
+def _forbid_flush(session: Session, flush_context, instances) -> None:
+    if session.info.get("read_only"):
+        raise InvalidRequestError("Read-only session can't flush changes")
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _forbid_writes(orm_execute_state) -> None:
+    state = orm_execute_state
+    if state.session.info.get("read_only") \
+            and (state.is_insert or state.is_update or state.is_delete):
+        raise InvalidRequestError("Read-only session can't execute writes")
@@ -1,25 +1,82 @@
+import time
+from typing import Awaitable, Callable, Optional
 from contextlib import asynccontextmanager
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.selectable import CTE
 
 from core.settings import settings
+from db.pool import MeasuredQueuePool, hold_stats
+from db.replicas import ReplicaSet
 
 
-engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URI)
-async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+def create_engine(uri: str) -> AsyncEngine:
+    """Engine with pool and driver settings"""
+    url = make_url(uri)
+    params = {}
+    if url.get_backend_name() != "sqlite":
+        params.update(poolclass=MeasuredQueuePool, **settings.pool_params)
+    if url.get_driver_name() == "asyncpg":
+        params.update(connect_args=dict(
+            prepared_statement_cache_size=settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+        ))
+    return create_async_engine(url, **params)
+
+
+CommitHook = Callable[[AsyncSession], Awaitable[None]]
+_commit_hooks: list[CommitHook] = []
+
+
+def on_commit(hook: CommitHook) -> CommitHook:
+    """Register coroutine function, which is awaited after commits of AppSession"""
+    _commit_hooks.append(hook)
+    return hook
+
+
+class AppSession(AsyncSession):
+    """
+    Async session of the app, which awaits commit hooks (see on_commit),
+    so async work after commit isn't done by sync session events
+    """
+
+    async def commit(self) -> None:
+        await super().commit()
+        for hook in _commit_hooks:
+            await hook(self)
+
+
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+async_session = sessionmaker(engine, expire_on_commit=False, class_=AppSession)
+
+replicas = ReplicaSet(
+    [create_engine(uri) for uri in settings.SQLALCHEMY_REPLICA_URIS],
+    selection=settings.DB_REPLICA_SELECTION,
+    retry_after=settings.DB_REPLICA_RETRY_AFTER,
+)
+
+
+def read_only_session() -> AsyncSession:
+    """Session of a replica (or primary if there is no one), which can't write"""
+    session = async_session(bind=replicas.select() or engine)
+    session.info["read_only"] = True
+    return session
 
 
 @asynccontextmanager
-async def in_transaction() -> AsyncSession:
+async def in_transaction(read_only: bool = False) -> AsyncSession:
     """
     Transaction context manager.
 
     You can run your code inside ``async with in_transaction() as tx:``
     statement to run it into one transaction. If error occurs transaction
     will rollback.
+
+    Read-only transaction goes to replica, see read_only_session.
     """
-    session = async_session()
+    session = read_only_session() if read_only else async_session()
     await session.begin()
     try:
         yield session
@@ -29,3 +86,105 @@ async def in_transaction() -> AsyncSession:
         raise
     finally:
         await session.close()
+
+
+@asynccontextmanager
+async def lazy_session(
+    read_only: bool = False,
+    label: Optional[str] = None,
+) -> AsyncSession:
+    """
+    Session context manager, which doesn't hold connection longer than needed.
+
+    Connection is taken from pool on the first statement, not on enter,
+    and is returned by release() - call it before slow I/O (sending emails,
+    requests to other services) when DB work is done. The session can be
+    used after release, it takes a new connection then. On exit changes are
+    committed, while session without writes is closed without COMMIT.
+
+    Time of holding connections is collected by label, see db.pool.hold_stats.
+
+    Loaded instances are referenced by the session until it's closed,
+    so its identity map isn't emptied by garbage collector, when
+    instances aren't used for a while (e.g. between dependencies).
+    """
+    session = read_only_session() if read_only else async_session()
+    session.info["label"] = label
+    session.info["instances"] = {}
+    try:
+        yield session
+        await release(session)
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+        session.info.pop("instances", None)
+
+
+async def release(session: AsyncSession) -> None:
+    """
+    Ends transaction of the session and returns connection to pool.
+
+    Changes are committed, if any, otherwise the transaction is closed
+    without COMMIT. Loaded instances are neither expired nor detached,
+    so they stay usable after release.
+    """
+    if session.info.get("has_writes") \
+            or session.new or session.dirty or session.deleted:
+        await session.commit()
+    else:
+        await session.run_sync(_close_transaction)
+
+
+def _close_transaction(session: Session) -> None:
+    # unlike rollback(), doesn't expire instances of the identity map
+    transaction = session.get_transaction()
+    if transaction is not None:
+        transaction.close()
+
+
+@event.listens_for(Session, "loaded_as_persistent")
+@event.listens_for(Session, "pending_to_persistent")
+@event.listens_for(Session, "detached_to_persistent")
+def _keep_loaded(session: Session, instance) -> None:
+    instances = session.info.get("instances")
+    if instances is not None:
+        instances[id(instance)] = instance
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed(session: Session, flush_context) -> None:
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_executed(orm_execute_state) -> None:
+    # text() isn't a select for ORM, so it is also counted as write
+    if not orm_execute_state.is_select \
+            or _has_dml_ctes(orm_execute_state.statement):
+        orm_execute_state.session.info["has_writes"] = True
+
+
+def _has_dml_ctes(statement) -> bool:
+    """Select of INSERT/UPDATE/DELETE ... RETURNING in WITH clause"""
+    return any(
+        isinstance(from_, CTE) and from_.element.is_dml
+        for from_ in getattr(statement, "froms", ())
+    )
+
+
+@event.listens_for(Session, "after_begin")
+def _connection_taken(session: Session, transaction, connection) -> None:
+    session.info.setdefault("connected_at", time.perf_counter())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _connection_returned(session: Session, transaction) -> None:
+    if transaction.parent is not None:
+        return
+    session.info.pop("has_writes", None)
+    connected_at = session.info.pop("connected_at", None)
+    label = session.info.get("label")
+    if connected_at is not None and label is not None:
+        hold_stats[label].add(time.perf_counter() - connected_at)
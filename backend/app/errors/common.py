@@ -8,6 +8,19 @@ class AppException(Exception):
     status_code = 400
 
 
+class ServerIsBusy(AppException):
+    """Server is busy, try again later"""
+    status_code = 503
+
+
+class BadCursor(AppException):
+    """Bad pagination cursor"""
+
+
+class BadSortParams(AppException):
+    """Bad sort params"""
+
+
 def object_not_found(
     model: Model,
     status_code: int = status.HTTP_400_BAD_REQUEST
@@ -22,3 +22,30 @@ class SocialTypes(str, Enum):
     vk = "vk"
     google = "google"
     facebook = "facebook"
+
+
+class CountStrategy(str, Enum):
+    """How total count of list rows is taken"""
+    exact = "exact"
+    estimate = "estimate"
+    cached = "cached"
+    window = "window"
+
+
+class ReplicaSelection(str, Enum):
+    """How replica is selected for read-only session"""
+    round_robin = "round_robin"
+    least_connections = "least_connections"
+
+
+class OnConflict(str, Enum):
+    """What bulk insert does with rows conflicting with existing ones"""
+    nothing = "nothing"
+    update = "update"
+
+
+class OutboxStatus(str, Enum):
+    """Delivery status of email in outbox"""
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"
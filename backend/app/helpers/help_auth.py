@@ -9,6 +9,7 @@ from models import AuthorizationData
 from extra import enums
 
 from core.security import verify_confirmation_code
+from db.sessions import release
 from services.mailing import messages
 
 
@@ -29,15 +30,16 @@ async def authenticate_user(
 
     if not auth_data.is_confirmed:
         account = auth_data.account
-
         await messages.ConfirmAccountMessage(
             account_id=account.id,
             email=account.email
-        ).send()
+        ).enqueue(db)
+        # committed before the error rolls back the request session
+        await release(db)
 
         raise errors.AccountIsNotConfirmed
 
-    if not auth_data.verify_password(params.password):
+    if not await auth_data.verify_password_async(params.password):
         raise errors.LoginError
 
     return auth_data.account_id
@@ -2,3 +2,4 @@ from .account import (
     Account, Role, AuthorizationData,
     SocialIntegration, account_role,
 )
+from .outbox import EmailOutbox
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from datetime import datetime
+from typing import ClassVar, Optional
 
 from sqlalchemy import (
     Column,
@@ -9,15 +10,28 @@ from sqlalchemy import (
     Enum,
     ForeignKey,
     Table,
+    event,
+    insert,
+    inspect,
+    select,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import make_transient_to_detached, relationship
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from extra.enums import Roles, RegistrationTypes, SocialTypes
 from db.model import Model
 from db.mixins import TimestampsMixin
-from core.security import get_password_hash, verify_password
+from db.sessions import on_commit
+from core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_password,
+    verify_password_async,
+)
+from core.principal import principals
 
 
 account_role = Table(
@@ -73,25 +87,111 @@ class Account(Model, TimestampsMixin):
         skip_confirmation: bool = False,
         **fields
     ) -> Account:
-        role = await Role.where(name=role).one(session)
-        account = await super().create(session=session, roles=[role], **fields)
-        auth_data = await AuthorizationData.create(
-            session=session,
+        """
+        Create account with its role, authorization data and,
+        for social registration, social integration.
+
+        On postgresql rows are inserted by one statement (see _insert_at_once).
+        """
+        role = await Role.get_cached(session, role)
+        auth_fields = await AuthorizationData._hash_password(dict(
             login=fields.get("email") or fields.get("phone"),
             password=password,
             registration_type=registration_type,
             confirmed_at=datetime.utcnow() if skip_confirmation else None,
-            account_id=account.id,
-        )
-
+        ))
+        social_fields = None
         if registration_type == RegistrationTypes.social:
+            social_fields = dict(social_type=social_type, external_id=external_id)
+
+        if session.bind.dialect.name == "postgresql":
+            return await cls._insert_at_once(
+                session, role, fields, auth_fields, social_fields
+            )
+
+        account = await super().create(session=session, roles=[role], **fields)
+        auth_data = await AuthorizationData.create(
+            session=session, account_id=account.id, **auth_fields
+        )
+        if social_fields is not None:
             await SocialIntegration.create(
-                session=session,
-                social_type=social_type,
-                external_id=external_id,
-                auth_data_id=auth_data.id,
+                session=session, auth_data_id=auth_data.id, **social_fields
             )
+        # the same as loaded by _insert_at_once
+        set_committed_value(account, "auths", [auth_data])
+        return account
 
+    @classmethod
+    async def _insert_at_once(
+        cls,
+        session: AsyncSession,
+        role: Role,
+        fields: dict,
+        auth_fields: dict,
+        social_fields: Optional[dict],
+    ) -> Account:
+        """
+        Insert account, its role, authorization data and social integration
+        by data-modifying CTEs of one statement, then put instances
+        into the session as loaded, without a query.
+        """
+        account_table = cls.__table__
+        auth_table = AuthorizationData.__table__
+        account_cte = insert(account_table)\
+            .values(**fields)\
+            .returning(*account_table.c)\
+            .cte("new_account")
+        account_id = select(account_cte.c.id).scalar_subquery()
+        role_cte = insert(account_role)\
+            .values(account_id=account_id, role_id=role.id)\
+            .returning(*account_role.c)\
+            .cte("new_account_role")
+        auth_cte = insert(auth_table)\
+            .values(account_id=account_id, **auth_fields)\
+            .returning(*auth_table.c)\
+            .cte("new_auth_data")
+
+        # CTEs are rendered, only if they are selected from
+        columns = [*account_cte.c, auth_cte.c.id.label("auth_data_id")]
+        criteria = [
+            role_cte.c.account_id == account_cte.c.id,
+            auth_cte.c.account_id == account_cte.c.id,
+        ]
+        if social_fields is not None:
+            social_table = SocialIntegration.__table__
+            social_cte = insert(social_table)\
+                .values(
+                    auth_data_id=select(auth_cte.c.id).scalar_subquery(),
+                    **social_fields,
+                )\
+                .returning(*social_table.c)\
+                .cte("new_social")
+            columns.append(social_cte.c.id.label("social_id"))
+            criteria.append(social_cte.c.auth_data_id == auth_cte.c.id)
+
+        row = (await session.execute(select(*columns).where(*criteria))).one()
+
+        account = _add_loaded(session, cls(
+            **{column.key: row._mapping[column.name] for column in account_table.c}
+        ))
+        auth_data = _add_loaded(session, AuthorizationData(
+            id=row.auth_data_id,
+            account_id=account.id,
+            **{column.key: auth_fields.get(column.key) for column in auth_table.c
+               if column.key not in ("id", "account_id")},
+        ))
+        socials = []
+        if social_fields is not None:
+            socials.append(_add_loaded(session, SocialIntegration(
+                id=row.social_id, auth_data_id=auth_data.id, **social_fields
+            )))
+
+        set_committed_value(account, "roles", [role])
+        set_committed_value(account, "auths", [auth_data])
+        set_committed_value(auth_data, "account", account)
+        set_committed_value(auth_data, "socials", socials)
+        for social in socials:
+            set_committed_value(social, "auth_data", auth_data)
         return account
 
     async def update(
@@ -106,7 +206,10 @@ class Account(Model, TimestampsMixin):
             ).one(session)
             await auth_data.update(session, password=fields.pop("password"))
 
-        return await super().update(session, **fields)
+        account = await super().update(session, **fields)
+        # active flag and roles of the account could be changed
+        principals.invalidate_on_commit(session, self.id)
+        return account
 
 
 class Role(Model):
@@ -123,6 +226,23 @@ class Role(Model):
         passive_deletes=True,
     )
 
+    # name -> column values, roles are rarely changed, so they are read once
+    # and read again only after changes of roles (see _reset_role_cache)
+    _cache: ClassVar[dict[Roles, dict]] = {}
+
+    @classmethod
+    async def get_cached(cls, session: AsyncSession, name: Roles) -> Role:
+        """Role by name without query, except the first call in the process"""
+        if name not in cls._cache:
+            roles = (await session.execute(select(cls))).scalars().all()
+            cls._cache = {
+                role.name: {c.key: getattr(role, c.key) for c in cls.__table__.c}
+                for role in roles
+            }
+        if name not in cls._cache:
+            raise NoResultFound("No row was found when one was required")
+        return _add_loaded(session, cls(**cls._cache[name]))
+
 
 class AuthorizationData(Model):
     __tablename__ = "auth_data"
@@ -163,6 +283,36 @@ class AuthorizationData(Model):
     def verify_password(self, password: str) -> bool:
         return verify_password(password, self._password)
 
+    async def verify_password_async(self, password: str) -> bool:
+        """verify_password, which doesn't block event loop"""
+        return await verify_password_async(password, self._password)
+
+    @staticmethod
+    async def _hash_password(fields: dict) -> dict:
+        # password setter would hash it in event loop
+        if fields.get("password") is not None:
+            fields["_password"] = await get_password_hash_async(fields.pop("password"))
+        return fields
+
+    @classmethod
+    async def create(
+        cls,
+        session: AsyncSession,
+        **fields
+    ) -> AuthorizationData:
+        return await super().create(session, **await cls._hash_password(fields))
+
+    async def update(
+        self,
+        session: AsyncSession,
+        **fields
+    ) -> AuthorizationData:
+        fields = await self._hash_password(fields)
+        auth_data = await super().update(session, **fields)
+        # confirmation makes the account active
+        principals.invalidate_on_commit(session, self.account_id)
+        return auth_data
+
 
 class SocialIntegration(Model):
     __tablename__ = "socials"
@@ -177,3 +327,33 @@ class SocialIntegration(Model):
         Integer, ForeignKey("auth_data.id", ondelete="CASCADE"), nullable=False
     )
     auth_data = relationship("AuthorizationData", back_populates="socials")
+
+
+principals.watch(Account.id)
+principals.watch(
+    AuthorizationData.account_id,
+    AuthorizationData.account_id,
+    AuthorizationData.confirmed_at,
+)
+principals.watch(account_role.c.account_id, *account_role.c)
+on_commit(principals.invalidate_committed)
+
+
+@event.listens_for(Role, "after_insert")
+@event.listens_for(Role, "after_update")
+@event.listens_for(Role, "after_delete")
+def _reset_role_cache(mapper, connection, role: Role) -> None:
+    Role._cache = {}
+
+
+def _add_loaded(session: AsyncSession, instance: Model) -> Model:
+    """
+    Put instance with all columns set into the session as loaded from database
+    or return the instance of the same row, which is already in the session.
+    """
+    make_transient_to_detached(instance)
+    loaded = session.identity_map.get(inspect(instance).key)
+    if loaded is not None:
+        return loaded
+    session.add(instance)
+    return instance
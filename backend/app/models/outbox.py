@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, JSON, Index
+
+from extra.enums import OutboxStatus
+from db.model import Model
+from db.mixins import TimestampsMixin
+
+
+class EmailOutbox(Model, TimestampsMixin):
+    """
+    Emails to send, written in transaction of the request
+    and sent by services.mailing.outbox.OutboxDispatcher.
+    """
+    __repr_attrs__ = ["message", "status"]
+
+    id = Column(Integer, primary_key=True, index=True)
+    # name of BaseMessage subclass and data of its validation schema
+    message = Column(String(100), nullable=False)
+    data = Column(JSON, nullable=False)
+
+    status = Column(
+        Enum(OutboxStatus, length=100), nullable=False, default=OutboxStatus.pending
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
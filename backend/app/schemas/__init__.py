@@ -4,3 +4,4 @@ from .general.token import *
 from .general.auth import *
 from .general.account import *
 from .general.role import *
+from .general.metrics import *
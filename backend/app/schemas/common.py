@@ -1,10 +1,15 @@
 from enum import Flag
+from typing import Optional
 from schemas.base import BaseModel
+from extra.enums import CountStrategy
 
 
 # Additional properties to return via API on get objects of specific table.
 class ResultMeta(BaseModel):
     count: int
+    count_strategy: CountStrategy = CountStrategy.exact
+    # cursor of the next page for keyset pagination
+    next_cursor: Optional[str] = None
 
 
 # Properties to return via API on get objects of specific table.
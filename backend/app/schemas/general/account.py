@@ -51,6 +51,24 @@ class AccountInDB(AccountInDBBase):
     ...
 
 
+# Authenticated account, which is cached to check permissions without DB.
+class Principal(BaseModel):
+    id: int
+    is_active: bool
+    roles: frozenset[enums.Roles] = frozenset()
+
+    def has_role(self, role: enums.Roles) -> bool:
+        return role in self.roles
+
+    @classmethod
+    def from_account(cls, account) -> 'Principal':
+        return cls(
+            id=account.id,
+            is_active=account.is_active,
+            roles={role.name for role in account.roles},
+        )
+
+
 # Properties to receive via API on creation open.
 class AccountCreateOpen(BaseModel):
     email: EmailStr = Field(..., title='Email')
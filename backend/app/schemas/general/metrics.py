@@ -0,0 +1,29 @@
+from typing import Optional
+from pydantic import Field
+
+from schemas.base import BaseModel
+
+
+# Connection pool of the worker which handled the request.
+class PoolStats(BaseModel):
+    pid: int = Field(..., title='Worker process id')
+    pool: str = Field(..., title='Pool class')
+    size: Optional[int] = Field(None, title='Pool size')
+    checked_in: Optional[int] = Field(None, title='Idle connections')
+    checked_out: Optional[int] = Field(None, title='Connections in use')
+    overflow: Optional[int] = Field(None, title='Connections above pool size')
+    checkouts: Optional[int] = Field(None, title='Connections taken from pool')
+    timeouts: Optional[int] = Field(None, title='Timeouts of waiting for connection')
+    failures: Optional[int] = Field(None, title='Failed connections')
+    wait_time_total: Optional[float] = Field(None, title='Seconds of waiting')
+    wait_time_max: Optional[float] = Field(None, title='Max seconds of waiting')
+    wait_time_avg: Optional[float] = Field(None, title='Average seconds of waiting')
+
+
+# Connections held by sessions of one endpoint in the worker.
+class HoldStats(BaseModel):
+    endpoint: str = Field(..., title='Endpoint, which used the session')
+    holds: int = Field(..., title='Connections taken by sessions')
+    hold_time_total: float = Field(..., title='Seconds of holding')
+    hold_time_max: float = Field(..., title='Max seconds of holding')
+    hold_time_avg: float = Field(..., title='Average seconds of holding')
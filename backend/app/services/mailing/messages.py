@@ -17,6 +17,7 @@ from .sender import BaseMessage
 
 class ConfirmAccountMessage(BaseMessage):
     template_name = 'confirm.html'
+    substitutions = ('url',)
 
     class validation(BaseMessage.validation):
         subject: str = 'Confirm registration'
@@ -31,6 +32,7 @@ class ConfirmAccountMessage(BaseMessage):
 
 class ChangePasswordMessage(BaseMessage):
     template_name = 'forget_password.html'
+    substitutions = ('url',)
 
     class validation(BaseMessage.validation):
         subject: str = 'Change password'
@@ -60,6 +62,7 @@ class SuccessfulRegistrationMessage(BaseMessage):
 
 class ChangeBankCardMessage(BaseMessage):
     template_name = 'change_bank_card.html'
+    substitutions = ('url',)
 
     class validation(BaseMessage.validation):
         subject: str = 'Failed to process payment'
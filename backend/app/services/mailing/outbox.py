@@ -0,0 +1,204 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.settings import settings
+from db.sessions import lazy_session
+from extra.enums import OutboxStatus
+from models import EmailOutbox
+
+from .sender import BaseMessage, send_batch
+
+
+logger = logging.getLogger("service(mailing)")
+
+
+class OutboxDispatcher:
+    """
+    Sends emails of outbox in background.
+
+    Due emails are claimed by batches: attempts are counted and emails
+    aren't due for lease seconds, so other dispatchers (workers) skip them,
+    and if the worker dies, they are sent by others after lease.
+    Claimed emails are sent by batches (see send_batch) concurrently,
+    not more than concurrency requests at once, without holding database
+    connection, by the shared client of sessions (or the given one).
+    Failed emails are retried with exponential backoff, until max_attempts
+    is reached.
+
+    Dispatcher is woken by commits of sessions, which enqueued emails,
+    otherwise outbox is checked every poll_interval seconds.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.EMAIL_OUTBOX_BATCH_SIZE,
+        concurrency: int = settings.EMAIL_OUTBOX_CONCURRENCY,
+        poll_interval: float = settings.EMAIL_OUTBOX_POLL_INTERVAL,
+        max_attempts: int = settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+        retry_backoff: float = settings.EMAIL_OUTBOX_RETRY_BACKOFF,
+        max_retry_backoff: float = settings.EMAIL_OUTBOX_MAX_RETRY_BACKOFF,
+        lease: float = settings.EMAIL_OUTBOX_LEASE,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.lease = lease
+        self.client = client
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def startup(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def dispatch(self) -> int:
+        """Send one batch of due emails, returns count of claimed emails"""
+        async with lazy_session(label="outbox") as db:
+            claimed = await self._claim(db)
+        if not claimed:
+            return 0
+
+        results: list[Optional[Exception]] = [None] * len(claimed)
+        messages = {}
+        for i, outbox in enumerate(claimed):
+            try:
+                messages[i] = BaseMessage.from_outbox(outbox)
+            except Exception as e:
+                results[i] = e
+
+        errors = await send_batch(
+            list(messages.values()), self.client, concurrency=self.concurrency
+        )
+        for i, error in zip(messages, errors):
+            results[i] = error
+        async with lazy_session(label="outbox") as db:
+            await self._save_results(db, claimed, results)
+        return len(claimed)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.dispatch()
+            except Exception:
+                logger.exception("Dispatching of email outbox is failed")
+                claimed = 0
+
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _claim(self, db: AsyncSession) -> list[EmailOutbox]:
+        now = datetime.utcnow()
+        due = select(EmailOutbox.id)\
+            .where(
+                EmailOutbox.status == OutboxStatus.pending,
+                EmailOutbox.next_attempt_at <= now,
+            )\
+            .order_by(EmailOutbox.next_attempt_at)\
+            .limit(self.batch_size)\
+            .with_for_update(skip_locked=True)
+        claim = update(EmailOutbox)\
+            .values(
+                attempts=EmailOutbox.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=self.lease),
+            )\
+            .execution_options(synchronize_session=False)
+
+        if db.bind.dialect.name == "postgresql":
+            return (await db.execute(
+                select(EmailOutbox).from_statement(
+                    claim.where(EmailOutbox.id.in_(due.scalar_subquery()))
+                    .returning(*EmailOutbox.__table__.c)
+                )
+            )).scalars().all()
+
+        ids = (await db.execute(due)).scalars().all()
+        if not ids:
+            return []
+        await db.execute(claim.where(EmailOutbox.id.in_(ids)))
+        return (await db.execute(
+            select(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids))
+            .execution_options(populate_existing=True)
+        )).scalars().all()
+
+    async def _save_results(
+        self,
+        db: AsyncSession,
+        claimed: list[EmailOutbox],
+        results: list[Optional[Exception]],
+    ) -> None:
+        now = datetime.utcnow()
+        sent = [
+            outbox.id for outbox, error in zip(claimed, results) if error is None
+        ]
+        if sent:
+            await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(sent))
+                .values(status=OutboxStatus.sent, sent_at=now, last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+
+        for outbox, error in zip(claimed, results):
+            if error is None:
+                continue
+            logger.warning(
+                "Email %s of outbox is failed, attempt %s: %r",
+                outbox.id, outbox.attempts, error,
+            )
+            values = dict(last_error=repr(error))
+            if outbox.attempts >= self.max_attempts:
+                values.update(status=OutboxStatus.failed)
+            else:
+                values.update(next_attempt_at=now + self.get_backoff(outbox.attempts))
+            await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == outbox.id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+    def get_backoff(self, attempts: int) -> timedelta:
+        seconds = self.retry_backoff * 2 ** (attempts - 1)
+        return timedelta(seconds=min(seconds, self.max_retry_backoff))
+
+
+outbox_dispatcher = OutboxDispatcher()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatcher(session: Session) -> None:
+    if session.info.pop("outbox", False):
+        outbox_dispatcher.wake()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_outbox(session: Session, transaction) -> None:
+    # emails of rolled back transaction aren't sent
+    if transaction.parent is None:
+        session.info.pop("outbox", None)
@@ -1,13 +1,23 @@
+import json
+import asyncio
 import logging
-from typing import Optional, Any
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional, Any, AsyncIterator
 
 import httpx
 import jinja2
+from jinja2 import meta
+from markupsafe import escape
 
 from pydantic import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.settings import settings
 from schemas.base import BaseModel
+from models import EmailOutbox
+from sessions import sessions
 
 
 template_dirs = [
@@ -15,13 +25,32 @@ template_dirs = [
     "src/services/mailing/templates",
 ]
 template_loader = jinja2.FileSystemLoader(template_dirs)
-template_env = jinja2.Environment(loader=template_loader, autoescape=True)
+template_env = jinja2.Environment(
+    loader=template_loader,
+    autoescape=True,
+    # templates aren't checked for changes on each get_template
+    auto_reload=not settings.is_production,
+    bytecode_cache=(
+        jinja2.FileSystemBytecodeCache(settings.EMAIL_TEMPLATES_CACHE_DIR)
+        if settings.EMAIL_TEMPLATES_CACHE_DIR else None
+    ),
+)
+
+# (template, values of its variables) -> html
+RENDER_CACHE_SIZE = 256
+_render_cache: OrderedDict[tuple, str] = OrderedDict()
 
 logger = logging.getLogger("service(mailing)")
 
+# class name -> message class, to send messages from outbox
+message_classes: dict[str, type["BaseMessage"]] = {}
+
 
 class BaseMessage:
     template_name: Optional[str] = None
+    # keys of context, which differ per recipient, so messages can be sent
+    # by batches with one content (see send_batch)
+    substitutions: tuple[str, ...] = ()
 
     class validation(BaseModel):
         email: EmailStr
@@ -30,6 +59,28 @@ class BaseMessage:
     def __init__(self, **kwargs):
         self.schema = self.validation(**kwargs)
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        message_classes[cls.__name__] = cls
+
+    @classmethod
+    def from_outbox(cls, outbox: EmailOutbox) -> "BaseMessage":
+        return message_classes[outbox.message](**outbox.data)
+
+    async def enqueue(self, session: AsyncSession) -> EmailOutbox:
+        """
+        Add the message to outbox in transaction of the session, so it is sent
+        by background dispatcher after commit (see services.mailing.outbox)
+        instead of waiting for SendGrid in request.
+        """
+        outbox = EmailOutbox(
+            message=self.__class__.__name__,
+            data=json.loads(self.schema.json()),
+        )
+        session.add(outbox)
+        session.info["outbox"] = True
+        return outbox
+
     def get_template(self) -> jinja2.Template:
         """Reimplement it in subclass if needed"""
         if self.template_name:
@@ -43,14 +94,37 @@ class BaseMessage:
         """Reimplement it in subclass if needed"""
         return self.schema.dict()
 
-    def get_payload(self) -> dict:
+    def get_payload(self, context: Optional[dict] = None) -> dict:
         """Reimplement it in subclass if needed"""
+        if context is None:
+            context = self.get_context()
         return {
             "type": "text/html",
-            "value": self.get_template().render(**self.get_context()),
+            "value": render(self.get_template(), context),
+        }
+
+    def get_personalization(self, context: Optional[dict] = None) -> dict:
+        """Recipient and subject, with substitutions, if context is given"""
+        to_email = self.schema.email
+        personalization = {
+            "to": [{"email": to_email, "name": to_email}],
+            "subject": self.get_subject(),
         }
+        if context is not None and self.substitutions:
+            # the same, as autoescape would render
+            personalization["substitutions"] = {
+                _get_tag(key): str(escape(context[key]))
+                for key in self.substitutions
+            }
+        return personalization
 
-    async def send(self) -> Optional[Any]:
+    def get_batch_payload(self, context: dict) -> dict:
+        """Content with tags of substitutions instead of their values"""
+        return self.get_payload({
+            **context, **{key: _get_tag(key) for key in self.substitutions}
+        })
+
+    async def send(self, client: httpx.AsyncClient = None) -> Optional[Any]:
         """ Send email through sendgrid
             curl --request POST \
             --url https://api.sendgrid.com/v3/mail/send \
@@ -67,37 +141,13 @@ class BaseMessage:
             "from":{"email":"sam.smith@example.com","name":"Sam Smith"},
             "reply_to":{"email":"sam.smith@example.com","name":"Sam Smith"}}' """
         to_email = self.schema.email
-        subject = self.get_subject()
         context = self.get_context()
 
         if settings.EMAIL_SEND_MODE:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url="https://api.sendgrid.com/v3/mail/send",
-                    headers={
-                        "Authorization": f"Bearer {settings.SEND_GRID_KEY}"
-                    },
-                    json={
-                        "personalizations": [
-                            {
-                                "to": [
-                                    {
-                                        "email": to_email,
-                                        "name": to_email,
-                                    }
-                                ],
-                                "subject": subject,
-                            }
-                        ],
-                        "content": [self.get_payload()],
-                        "from": {
-                            "email": settings.COMPANY_EMAIL,
-                            "name": settings.COMPANY_NAME,
-                        },
-                    },
+            async with _get_client(client) as client:
+                response = await _post(
+                    client, [self.get_personalization()], self.get_payload(context)
                 )
-                if response.status_code not in range(200, 300):
-                    raise Exception(f"Send mail is failed: {response.text}")
             logger.info("Email to %s, response: %s", to_email, response)
         else:
             response = None
@@ -106,3 +156,160 @@ class BaseMessage:
             )
 
         return response
+
+
+def precompile_templates() -> None:
+    """Compile all templates on startup, so the first emails don't wait for it"""
+    for name in template_env.list_templates(extensions=["html"]):
+        template_env.get_template(name)
+
+
+def render(template: jinja2.Template, context: dict) -> str:
+    """
+    Render the template, result is cached by values of variables used
+    by the template, so messages with static context (or with substitutions
+    instead of values, see BaseMessage.get_batch_payload) are rendered once.
+    """
+    variables = _get_variables(template)
+    if variables is None:
+        return template.render(**context)
+    key = (template, tuple(context.get(name) for name in variables))
+    try:
+        html = _render_cache.get(key)
+    except TypeError:
+        # unhashable values
+        return template.render(**context)
+    if html is None:
+        html = _render_cache[key] = template.render(**context)
+        if len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    else:
+        _render_cache.move_to_end(key)
+    return html
+
+
+@lru_cache(maxsize=64)
+def _get_variables(template: jinja2.Template) -> Optional[tuple[str, ...]]:
+    """
+    Variables used by the template or None, if it can't be cached:
+    it isn't loaded from file or uses other templates.
+    Reloaded template is a new object, so it isn't stale.
+    """
+    if template.name is None or template.environment is not template_env:
+        return None
+    source, _, _ = template_env.loader.get_source(template_env, template.name)
+    ast = template_env.parse(source)
+    if any(True for _ in meta.find_referenced_templates(ast)):
+        return None
+    return tuple(sorted(meta.find_undeclared_variables(ast)))
+
+
+async def send_batch(
+    messages: list[BaseMessage],
+    client: httpx.AsyncClient = None,
+    concurrency: int = settings.EMAIL_OUTBOX_CONCURRENCY,
+) -> list[Optional[Exception]]:
+    """
+    Send messages with the same content by one request to SendGrid
+    with personalization per recipient (up to SEND_GRID_MAX_PERSONALIZATIONS),
+    requests are sent concurrently, not more than concurrency at once.
+
+    Returns error or None per message.
+    """
+    results: list[Optional[Exception]] = [None] * len(messages)
+    # content -> indexes of messages and their personalizations
+    batches: dict[str, list[tuple[int, dict]]] = {}
+    for i, message in enumerate(messages):
+        try:
+            context = message.get_context()
+            payload = message.get_batch_payload(context)
+            personalization = message.get_personalization(context)
+        except Exception as e:
+            results[i] = e
+            continue
+        batches.setdefault(json.dumps(payload), []).append((i, personalization))
+
+    if not settings.EMAIL_SEND_MODE:
+        for message in messages:
+            logger.info("Dropping email sending to %s", message.schema.email)
+        return results
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(payload: dict, batch: list[tuple[int, dict]]) -> None:
+        async with semaphore:
+            try:
+                response = await _post(client, [p for _, p in batch], payload)
+            except Exception as e:
+                logger.warning("Emails to %s recipients are failed: %r", len(batch), e)
+                for i, _ in batch:
+                    results[i] = e
+            else:
+                logger.info(
+                    "Emails to %s recipients, response: %s", len(batch), response
+                )
+
+    async with _get_client(client) as client:
+        await asyncio.gather(*(
+            send(json.loads(payload), chunk)
+            for payload, batch in batches.items()
+            for chunk in _split_batch(batch)
+        ))
+    return results
+
+
+def _split_batch(batch: list[tuple[int, dict]]) -> list[list[tuple[int, dict]]]:
+    """Chunks of personalizations within limit, without repeated recipients"""
+    chunks: list[list[tuple[int, dict]]] = []
+    recipients: set[str] = set()
+    for item in batch:
+        email = item[1]["to"][0]["email"]
+        if not chunks or email in recipients \
+                or len(chunks[-1]) >= settings.SEND_GRID_MAX_PERSONALIZATIONS:
+            chunks.append([])
+            recipients = set()
+        chunks[-1].append(item)
+        recipients.add(email)
+    return chunks
+
+
+def _get_tag(key: str) -> str:
+    return f"-{key}-"
+
+
+@asynccontextmanager
+async def _get_client(
+    client: Optional[httpx.AsyncClient],
+) -> AsyncIterator[httpx.AsyncClient]:
+    """Given or shared client, temporary one, if app isn't started (scripts)"""
+    client = client or sessions.http_client
+    if client is not None:
+        yield client
+        return
+    async with httpx.AsyncClient() as client:
+        yield client
+
+
+async def _post(
+    client: httpx.AsyncClient,
+    personalizations: list[dict],
+    content: dict,
+) -> httpx.Response:
+    response = await client.post(
+        url=settings.SEND_GRID_URL,
+        headers={
+            "Authorization": f"Bearer {settings.SEND_GRID_KEY}"
+        },
+        json={
+            "personalizations": personalizations,
+            "content": [content],
+            "from": {
+                "email": settings.COMPANY_EMAIL,
+                "name": settings.COMPANY_NAME,
+            },
+        },
+        timeout=settings.SEND_GRID_TIMEOUT,
+    )
+    if response.status_code not in range(200, 300):
+        raise Exception(f"Send mail is failed: {response.text}")
+    return response
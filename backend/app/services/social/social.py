@@ -18,8 +18,10 @@ from helpers.help_account import is_email_exists
 
 from core.settings import settings
 from core.security import generate_token
+from db.sessions import release
 
 from services.mailing import messages
+from services.social.state import social_states
 
 
 def get_url_to_redirect(social_type: enums.SocialTypes) -> Optional[str]:
@@ -59,13 +61,10 @@ async def get_facebook_user(code: str) -> schemas.RegistrationFromSocialFacebook
     text = None
     try:
         # getting token
-        async with session.get(
-            'https://graph.facebook.com/v8.0/oauth/access_token',
-            params=params
-        ) as resp:
-            if resp.status != 200:
-                raise errors.SocialLoginFailed
-            text = await resp.text()
+        resp = await session.get('/v8.0/oauth/access_token', params=params)
+        if resp.status_code != 200:
+            raise errors.SocialLoginFailed
+        text = resp.text
 
         req = schemas.FacebookAccessTokenRequest.parse_raw(text)
         params = dict(
@@ -73,10 +72,10 @@ async def get_facebook_user(code: str) -> schemas.RegistrationFromSocialFacebook
             access_token=req.access_token,
         )
         # getting user fields
-        async with session.get('https://graph.facebook.com/me', params=params) as resp:
-            text = await resp.text()
-            if resp.status != 200:
-                raise errors.SocialLoginFailed
+        resp = await session.get('/me', params=params)
+        text = resp.text
+        if resp.status_code != 200:
+            raise errors.SocialLoginFailed
 
         schema = schemas.RegistrationFromSocialFacebook.parse_raw(text)
 
@@ -107,10 +106,10 @@ async def get_vk_user(code: str) -> schemas.RegistrationFromSocialVK:
     text = None
     try:
         # getting token and email at once
-        async with session.get('https://oauth.vk.com/access_token', params=params) as resp:     # noqa
-            if resp.status != 200:
-                raise errors.SocialLoginFailed
-            text = await resp.text()
+        resp = await session.get('/access_token', params=params)
+        if resp.status_code != 200:
+            raise errors.SocialLoginFailed
+        text = resp.text
 
         schema = schemas.RegistrationFromSocialVK.parse_raw(text)
 
@@ -149,18 +148,14 @@ async def get_google_user(
     return schema
 
 
-__social_user_cache = {}
-
-
 async def get_user_schema(
     social_type: enums.SocialTypes,
     code: str
 ) -> types.SocialRegistrationSchema:
     """Retrieving User Data by OAuth Code"""
 
-    if code not in __social_user_cache:
-        schema = None
-
+    schema = await social_states.get(code)
+    if schema is None:
         if social_type == enums.SocialTypes.vk:
             schema = await get_vk_user(code)
 
@@ -173,20 +168,21 @@ async def get_user_schema(
         if schema is None:
             raise errors.UnknownSocialType
 
-        __social_user_cache[code] = schema
+        await social_states.set(code, schema)
 
-    return __social_user_cache[code]
+    return schema
 
 
-def get_token(code: str) -> schemas.AuthToken:
+async def get_token(code: str) -> schemas.AuthToken:
     """Issuing an authorization token for an account bound by OAuth authorization"""
-    if user_schema := __social_user_cache.get(code):
+    # token is issued once, even for concurrent requests with the code
+    if user_schema := await social_states.pop(code):
         # user was redirected from social login right now
         if not user_schema.email or not user_schema.application_account_id:
             # sanity check
             # confused endpoint, something is wrong with the frontend
+            await social_states.set(code, user_schema)
             raise errors.SocialUserEmailIsNotConfirmed
-        __social_user_cache.pop(code)
         return generate_token(user_schema.application_account_id)
     else:
         raise errors.BadSocialCode
@@ -196,13 +192,14 @@ async def send_confirmation_email(
     db: AsyncSession,
     form: schemas.RequestConfirmationEmailBySocialCode
 ) -> None:
-    if schema := __social_user_cache.get(form.code):
+    if schema := await social_states.get(form.code):
         # user was redirected from social login right now
         if await is_email_exists(db, form.email):
             # sorry, email is registered
             raise errors.EmailIsExists
 
         schema.email = form.email
+        await social_states.set(form.code, schema)
         # creating account
         social_type, external_id = schema.get_type_and_user_id()
 
@@ -214,11 +211,11 @@ async def send_confirmation_email(
             social_type=social_type,
             external_id=external_id
         )
-
         await messages.ConfirmAccountMessage(
             account_id=account.id,
             email=schema.email
-        ).send()
+        ).enqueue(db)
+        await release(db)
 
     else:
         raise errors.BadSocialCode
@@ -231,15 +228,16 @@ async def registration(
 ) -> None:
     social_type, external_id = schema.get_type_and_user_id()
 
+    # lookups depend on each other, so they are made one by one
+    # and the auth data of the integration is joined to the first one
     social_integration = await SocialIntegration.where(
         social_type=social_type,
         external_id=external_id,
-    ).one_or_none(db)
+    ).with_joined("auth_data").one_or_none(db)
 
     if social_integration:
         # user was logged in before through this social
-        auth_data = await social_integration.auth_data
-        account_id = auth_data.account_id
+        account_id = social_integration.auth_data.account_id
     else:
         auth_data = await AuthorizationData.where(
             login=schema.email,
@@ -280,13 +278,14 @@ async def registration(
                     social_type=social_type,
                     external_id=external_id
                 )
-
                 await messages.ConfirmAccountMessage(
                     account_id=account.id,
                     email=schema.email
-                ).send()
+                ).enqueue(db)
+                await release(db)
 
             account_id = account.id
 
     # store account_id for next frontend retrieval
-    __social_user_cache[code].application_account_id = account_id
+    schema.application_account_id = account_id
+    await social_states.set(code, schema)
@@ -0,0 +1,113 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from aiocache import Cache
+from aiocache.base import BaseCache
+
+import schemas
+from extra import types
+from core.settings import settings
+from utils.cache import TTLCache, redis_clear, redis_pop
+
+
+schema_classes = {
+    cls._social_type: cls
+    for cls in (
+        schemas.RegistrationFromSocialVK,
+        schemas.RegistrationFromSocialFacebook,
+        schemas.RegistrationFromSocialGoogle,
+    )
+}
+
+
+class SocialStateStore(ABC):
+    """
+    Users of social logins by OAuth code, from redirect of OAuth service
+    till getting of token. Entries expire after ttl seconds.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @abstractmethod
+    async def get(self, code: str) -> Optional[types.SocialRegistrationSchema]:
+        ...
+
+    @abstractmethod
+    async def set(self, code: str, schema: types.SocialRegistrationSchema) -> None:
+        ...
+
+    @abstractmethod
+    async def pop(self, code: str) -> Optional[types.SocialRegistrationSchema]:
+        """Get and delete the entry at once"""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+
+class LocalStateStore(SocialStateStore):
+    """In-process store of one worker, not more than maxsize entries"""
+
+    def __init__(self, maxsize: int, ttl: int):
+        super().__init__(ttl)
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, code: str) -> Optional[types.SocialRegistrationSchema]:
+        return self.entries.get(code)
+
+    async def set(self, code: str, schema: types.SocialRegistrationSchema) -> None:
+        self.entries.set(code, schema)
+
+    async def pop(self, code: str) -> Optional[types.SocialRegistrationSchema]:
+        return self.entries.pop(code)
+
+    async def clear(self) -> None:
+        self.entries.clear()
+
+
+class RedisStateStore(SocialStateStore):
+    """Store shared by workers, so redirect and token can go to any of them"""
+
+    def __init__(self, redis: BaseCache, ttl: int):
+        super().__init__(ttl)
+        self.redis = redis
+
+    async def get(self, code: str) -> Optional[types.SocialRegistrationSchema]:
+        return _loads(await self.redis.get(code))
+
+    async def set(self, code: str, schema: types.SocialRegistrationSchema) -> None:
+        await self.redis.set(code, _dumps(schema), ttl=self.ttl)
+
+    async def pop(self, code: str) -> Optional[types.SocialRegistrationSchema]:
+        # atomic, so only one request gets the token by code
+        return _loads(await redis_pop(self.redis, code))
+
+    async def clear(self) -> None:
+        await redis_clear(self.redis)
+
+
+def _dumps(schema: types.SocialRegistrationSchema) -> str:
+    social_type, _ = schema.get_type_and_user_id()
+    return json.dumps(dict(type=social_type, data=json.loads(schema.json())))
+
+
+def _loads(raw: Optional[str]) -> Optional[types.SocialRegistrationSchema]:
+    if raw is None:
+        return None
+    entry = json.loads(raw)
+    return schema_classes[entry["type"]].parse_obj(entry["data"])
+
+
+def _get_store() -> SocialStateStore:
+    if not settings.SOCIAL_STATE_REDIS:
+        return LocalStateStore(
+            maxsize=settings.SOCIAL_STATE_SIZE, ttl=settings.SOCIAL_STATE_TTL
+        )
+    params = dict(settings.DEFAULT_CACHE_PARAMS)
+    redis = Cache(params.pop("cache"), namespace="social:", **params)
+    return RedisStateStore(redis, ttl=settings.SOCIAL_STATE_TTL)
+
+
+social_states = _get_store()
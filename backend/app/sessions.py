@@ -1,18 +1,46 @@
+from typing import Optional
+
 import httpx
 from aiogoogle import Aiogoogle
 
 from core.settings import settings
+from utils.oauth import OAuthProvider
 
 
 class Sessions:
     def __init__(self):
-        self.vk_session = None
-        self.facebook_session = None
+        # pooled client of the process for requests to other services
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.vk_session: Optional[OAuthProvider] = None
+        self.facebook_session: Optional[OAuthProvider] = None
         self.google_session = None
 
     async def startup(self):
-        self.vk_session = httpx.Client()
-        self.facebook_session = httpx.Client()
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        self.http_client = httpx.AsyncClient(
+            http2=settings.HTTP_CLIENT_HTTP2,
+            timeout=settings.HTTP_CLIENT_TIMEOUT,
+            limits=limits,
+        )
+        self.vk_session = OAuthProvider(
+            name="vk",
+            base_url=settings.OAUTH_VK_API_URL,
+            client=self.http_client,
+            timeout=settings.OAUTH_VK_TIMEOUT,
+            concurrency=settings.OAUTH_CONCURRENCY,
+            retries=settings.OAUTH_RETRIES,
+        )
+        self.facebook_session = OAuthProvider(
+            name="facebook",
+            base_url=settings.OAUTH_FB_API_URL,
+            client=self.http_client,
+            timeout=settings.OAUTH_FB_TIMEOUT,
+            concurrency=settings.OAUTH_CONCURRENCY,
+            retries=settings.OAUTH_RETRIES,
+        )
         self.google_session = Aiogoogle(client_creds=dict(
             client_id=settings.OAUTH_GOOGLE_CLIENT_ID,
             client_secret=settings.OAUTH_GOOGLE_CLIENT_SECRET,
@@ -21,8 +49,9 @@ class Sessions:
         ))
 
     async def cleanup(self):
-        await self.vk_session.close()
-        await self.facebook_session.close()
+        # providers use the shared client
+        await self.http_client.aclose()
+        self.http_client = None
         await self.google_session.active_session.close()
 
 
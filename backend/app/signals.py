@@ -2,6 +2,10 @@ from typing import Callable
 
 import db as db_signals
 import sessions as sessions_signals
+from core.security import password_hasher
+from db.sessions import replicas
+from services.mailing.outbox import outbox_dispatcher
+from services.mailing.sender import precompile_templates
 
 startup_callbacks: list[Callable] = [
     db_signals.db_init,
@@ -9,8 +13,13 @@ startup_callbacks: list[Callable] = [
     db_signals.create_initial_roles,
     db_signals.create_initial_superuser,
     sessions_signals.sessions.startup,
+    precompile_templates,
+    outbox_dispatcher.startup,
 ]
 
 shutdown_callbacks: list[Callable] = [
+    outbox_dispatcher.shutdown,
     sessions_signals.sessions.cleanup,
+    password_hasher.shutdown,
+    replicas.dispose,
 ]
@@ -1,12 +1,15 @@
 import pytest
 import sqlalchemy as sa
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 
-from db.mixins import CRUDMixin, SmartQueryMixin
+from db.mixins import CRUDMixin, SmartQueryMixin, crud
+from db.mixins.crud import get_unique_keys
+from db.mixins.eagerload import SUBQUERY
+from extra.enums import OnConflict
 from core.settings import settings
 
 from tests.utils import faker
@@ -80,6 +83,13 @@ class Comment(BaseModel):
     # post = backref from Post.comments
 
 
+class Tag(BaseModel):
+    __tablename__ = "tag"
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String, unique=True, nullable=False)
+    uses = sa.Column(sa.Integer, default=0)
+
+
 def get_users_data():
     return [{"name": faker.name()} for _ in range(3)]
 
@@ -188,7 +198,9 @@ class TestTimestamps:
     async def test_bulk_create(self, db):
         names = [faker.name() for _ in range(3)]
         users = [User(name=name) for name in names]
-        await User.bulk_create(db, users)
+        assert await User.bulk_create(db, users) == (3, 0)
+        # instances are added to the session, like by add_all()
+        assert all(user.id and user in db for user in users)
 
         db_users_names = (
             (await db.execute(sa.select(User.name).filter(User.name.in_(names))))
@@ -197,3 +209,146 @@ class TestTimestamps:
         )
 
         assert names == db_users_names
+
+    async def test_bulk_create_dicts(self, db):
+        result = await Tag.bulk_create(
+            db, [{"name": f"tag_{i}", "uses": i} for i in range(5)], batch_size=2
+        )
+        assert result == (5, 0)
+        assert await db.scalar(sa.select(sa.func.sum(Tag.uses))) == 10
+
+        with pytest.raises(KeyError):
+            await Tag.bulk_create(db, [{"INCORRECT_ATTRUBUTE": "nomatter"}])
+
+    async def test_bulk_create_on_conflict(self, db):
+        rows = [{"name": "tag_0", "uses": 100}, {"name": "tag_new", "uses": 1}]
+        result = await Tag.bulk_create(db, rows, OnConflict.nothing, ["name"])
+        assert result == (1, 0)
+        assert (await Tag.where(name="tag_0").one(db)).uses == 0
+
+        rows = [
+            {"name": "tag_1", "uses": 100},
+            {"name": "tag_2", "uses": 100},
+            {"name": "tag_2", "uses": 200},
+            {"name": "tag_newer", "uses": 1},
+        ]
+        result = await Tag.bulk_create(db, rows, OnConflict.update, ["name"])
+        assert result == (1, 2)
+        with pytest.raises(ValueError):
+            await Tag.bulk_create(db, rows, OnConflict.update)
+        uses = await db.execute(
+            sa.select(Tag.name, Tag.uses)
+            .filter(Tag.name.in_(["tag_1", "tag_2", "tag_newer"]))
+            .order_by(Tag.name)
+            .execution_options(populate_existing=True)
+        )
+        assert uses.all() == [("tag_1", 100), ("tag_2", 200), ("tag_newer", 1)]
+
+    async def test_get_or_create_race(self, db, monkeypatch):
+        await db.execute(sa.insert(Tag).values(name="raced", uses=7))
+        where = Tag.where.__func__
+        lookups = []
+
+        def racing_where(cls, **filters):
+            # the row is inserted by concurrent transaction after the lookup
+            lookups.append(filters)
+            query = where(cls, **filters)
+            return query.filter(sa.false()) if len(lookups) == 1 else query
+
+        monkeypatch.setattr(Tag, "where", classmethod(racing_where))
+        # name is unique, so upsert would be used on postgresql
+        monkeypatch.setattr(crud, "_can_upsert", lambda *args: False)
+        tag, is_created = await Tag.get_or_create(db, name="raced")
+        assert is_created is False
+        assert tag.uses == 7
+        # the lookup missed the row, it's fetched after failed insert
+        assert len(lookups) == 2
+
+        with pytest.raises(IntegrityError):
+            # existing row differs by other lookup parameters
+            await Tag.get_or_create(db, name="raced", uses=8)
+        # savepoint is rolled back, transaction is alive
+        assert await Tag.where(name="raced").count(db) == 1
+
+    async def test_update_or_create_defaults(self, db):
+        tag, is_created = await Tag.update_or_create(
+            db, defaults={"uses": 1}, name="updated"
+        )
+        assert is_created is True
+        tag, is_created = await Tag.update_or_create(
+            db, defaults={"uses": 2}, name="updated"
+        )
+        assert is_created is False
+        assert tag.uses == 2
+
+    def test_unique_keys(self):
+        assert set(get_unique_keys(Tag)) == {("id",), ("name",)}
+
+    async def test_find_many(self, db):
+        users = [await User.create(db, name=faker.name()) for _ in range(3)]
+        ids = [users[2].id, users[0].id, users[2].id, users[1].id]
+        expected = [users[2], users[0], users[2], users[1]]
+
+        statements = []
+
+        def on_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+        try:
+            # users are in identity map
+            assert await User.find_many(db, ids) == expected
+            assert not statements
+
+            db.expunge(users[0])
+            db.expunge(users[1])
+            found = await User.find_many(db, ids, preserve_order=False)
+            # identity map goes first, then the rest is fetched by one query
+            assert found[0] is users[2]
+            assert {user.id for user in found} == {user.id for user in users}
+            assert len(statements) == 1
+        finally:
+            sa.event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+
+        ids = [users[0].id, 100_000_000]
+        assert [user.id for user in await User.find_many(db, ids)] == ids[:1]
+        found = await User.find_many(db, ids, missing="none")
+        assert found[0].id == users[0].id and found[1] is None
+        with pytest.raises(NoResultFound):
+            await User.find_many(db, ids, missing="raise")
+
+    async def test_find_many_schema(self, db):
+        user = await User.create(db, name=faker.name())
+        await Post.create(db, body=faker.name(), user=user)
+        db.expunge_all()
+        user = await db.get(User, user.id)
+        assert "posts" in sa.inspect(user).unloaded
+
+        found = await User.find_many(db, [user.id], schema={"posts": SUBQUERY})
+        assert found == [user]
+        assert len(user.posts) == 1
+
+
+@pytest.mark.skipif(
+    engine.dialect.name != "postgresql",
+    reason="INSERT ... ON CONFLICT RETURNING is used on postgresql",
+)
+@pytest.mark.asyncio
+class TestUpsert:
+    async def test_get_or_create(self, db):
+        statements = []
+
+        def on_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+        try:
+            tag, is_created = await Tag.get_or_create(db, name="upserted", uses=3)
+            assert is_created is True
+            same, is_created = await Tag.get_or_create(db, name="upserted", uses=3)
+            assert is_created is False
+            assert same is tag
+        finally:
+            sa.event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+        assert len(statements) == 2
+        assert all("ON CONFLICT" in statement for statement in statements)
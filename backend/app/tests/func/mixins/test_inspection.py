@@ -102,9 +102,35 @@ def test_settable_relations():
 
 def test_hybrid_attributes():
     assert set(User.hybrid_properties) == {'surname'}
-    assert Post.hybrid_properties == []
+    assert Post.hybrid_properties == ()
 
 
 def test_hybrid_methods():
     assert set(User.hybrid_methods) == {'with_first_name'}
-    assert Post.hybrid_methods == []
+    assert Post.hybrid_methods == ()
+
+
+def test_metadata_is_computed_once():
+    assert User.columns is User.columns
+    assert User.relations is User.relations
+    assert User.hybrid_methods_full is User.hybrid_methods_full
+
+
+def test_metadata_is_immutable():
+    assert isinstance(User.columns, tuple)
+    assert isinstance(User.relations, tuple)
+    with pytest.raises(TypeError):
+        User.hybrid_methods_full['other'] = None
+
+def test_metadata_is_invalidated_by_new_mappers():
+    assert 'tags' not in User.relations
+
+    class Tag(BaseModel):
+        __tablename__ = 'tag'
+        id = sa.Column(sa.Integer, primary_key=True)
+        user_id = sa.Column(sa.Integer, sa.ForeignKey('user.id'))
+        user = sa.orm.relationship('User', backref='tags')
+
+    # backref from new mapper
+    assert set(User.relations) == {'posts', 'posts_viewonly', 'tags'}
+    assert set(Tag.relations) == {'user'}
@@ -10,7 +10,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from core.settings import settings
 
 from db.mixins import SmartQueryMixin
-from db.mixins.smartquery import smart_query
+from db.mixins.smartquery import smart_query, query_cache
 from db.mixins.eagerload import JOINED, SUBQUERY
 
 from tests.func.mixins.utils import in_tx
@@ -462,6 +462,79 @@ class TestFilterExpr(BaseTest):
         await test(dict(created_at__month_lt=10), {cm11})
 
 
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("setup_db", "session")
+class TestCompiledFilters(BaseTest):
+    def test_incorrect_keys(self):
+        with pytest.raises(KeyError) as e:
+            Comment.filter_expr(rating__INCORRECT_OPERATOR=1)
+        assert "has incorrect operator `INCORRECT_OPERATOR`" in str(e.value)
+
+        with pytest.raises(KeyError) as e:
+            Comment.filter_expr(INCORRECT_ATTR__gt=1)
+        assert "has incorrect attribute `INCORRECT_ATTR`" in str(e.value)
+
+        # incorrect keys are not remembered
+        assert "INCORRECT_ATTR__gt" not in Comment._metadata.filter_keys
+
+    def test_keys_are_parsed_once(self):
+        Comment.filter_expr(rating__gt=1, body="cm11 to p11")
+        assert Comment._metadata.filter_keys["rating__gt"] == (
+            "rating", sa.sql.operators.gt
+        )
+        assert Comment._metadata.filter_keys["body"] == (
+            "body", sa.sql.operators.eq
+        )
+        assert Post._parse_filter_key("is_public") == ("is_public", None)
+
+    async def test_batched_specs(self, session):
+        (
+            u1,
+            u2,
+            u3,
+            p11,
+            p12,
+            p21,
+            p22,
+            cm11,
+            cm12,
+            cm21,
+            cm22,
+            cm_empty,
+        ) = await self._create_initial_data(session)
+
+        specs = [{"rating__ge": 2}, {"body__startswith": "cm1"}]
+        stmt = sa.select(Comment).filter(*Comment.filter_expr(*specs))
+        assert set((await session.execute(stmt)).scalars().all()) == {cm12}
+
+        stmt = sa.select(Comment).filter(*Comment.filter_expr(*specs, id__ne=12))
+        assert set((await session.execute(stmt)).scalars().all()) == set()
+
+    async def test_compile_filter(self, session):
+        (
+            u1,
+            u2,
+            u3,
+            p11,
+            p12,
+            p21,
+            p22,
+            cm11,
+            cm12,
+            cm21,
+            cm22,
+            cm_empty,
+        ) = await self._create_initial_data(session)
+
+        rating_gt = Comment.compile_filter("rating__gt")
+        stmt = sa.select(Comment).filter(rating_gt(2))
+        assert set((await session.execute(stmt)).scalars().all()) == {cm22}
+
+        is_public = Post.compile_filter("is_public")
+        stmt = sa.select(Post).filter(is_public(False))
+        assert set((await session.execute(stmt)).scalars().all()) == {p11}
+
+
 @pytest.mark.incremental
 @pytest.mark.asyncio
 @pytest.mark.usefixtures("setup_db", "session")
@@ -1170,3 +1243,131 @@ class TestSmartQueryAutoEagerLoad(BaseTest):
         _ = comments[0].post
         # no additional query needed: we used 'post' relation in smart_query()
         assert self.query_count == 3
+
+
+@pytest.mark.incremental
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("setup_db", "session")
+class TestSmartQueryCache(BaseTest):
+    async def test_same_shape_is_cached(self, session):
+        (
+            u1,
+            u2,
+            u3,
+            p11,
+            p12,
+            p21,
+            p22,
+            cm11,
+            cm12,
+            cm21,
+            cm22,
+            cm_empty,
+        ) = await self._create_initial_data(session)
+        query_cache.clear()
+
+        comments = (
+            (await session.execute(Comment.where(rating__in=[1, 2], post___public=False)))
+            .unique()
+            .scalars()
+            .all()
+        )
+        assert set(comments) == {cm11}
+        assert query_cache.info().misses == 1
+
+        # same shape, other values
+        comments = (
+            (await session.execute(Comment.where(rating__in=[3], post___public=True)))
+            .unique()
+            .scalars()
+            .all()
+        )
+        assert set(comments) == {cm22}
+
+        comments = (
+            (await session.execute(Comment.where(rating__between=(2, 3), post___public=True)))
+            .unique()
+            .scalars()
+            .all()
+        )
+        assert set(comments) == {cm12, cm22}
+
+        comments = (
+            (await session.execute(Comment.where(rating__between=(1, 1), post___public=True)))
+            .unique()
+            .scalars()
+            .all()
+        )
+        assert set(comments) == {cm21}
+
+        info = query_cache.info()
+        assert (info.hits, info.misses, info.currsize) == (2, 2, 2)
+
+    async def test_value_dependent_filters(self, session):
+        (
+            u1,
+            u2,
+            u3,
+            p11,
+            p12,
+            p21,
+            p22,
+            cm11,
+            cm12,
+            cm21,
+            cm22,
+            cm_empty,
+        ) = await self._create_initial_data(session)
+        query_cache.clear()
+
+        # isnull and None values change SQL, but not the shape
+        comments = (await session.execute(Comment.where(user__isnull=True))).scalars().all()
+        assert set(comments) == {cm_empty}
+        comments = (await session.execute(Comment.where(user__isnull=False))).scalars().all()
+        assert set(comments) == {cm11, cm12, cm21, cm22}
+        comments = (await session.execute(Comment.where(rating=None))).scalars().all()
+        assert set(comments) == {cm_empty}
+        comments = (await session.execute(Comment.where(rating=3))).scalars().all()
+        assert set(comments) == {cm22}
+
+        # hybrid methods get the value on each call
+        posts = (
+            (await session.execute(Post.where(public=False, is_commented_by_user=u1)))
+            .unique()
+            .scalars()
+            .all()
+        )
+        assert set(posts) == {p11}
+        posts = (
+            (await session.execute(Post.where(public=True, is_commented_by_user=u2)))
+            .unique()
+            .scalars()
+            .all()
+        )
+        assert set(posts) == {p12}
+
+        info = query_cache.info()
+        assert (info.hits, info.misses, info.currsize) == (3, 3, 3)
+
+    async def test_incorrect_filters_are_not_cached(self):
+        query_cache.clear()
+        with pytest.raises(KeyError):
+            _ = User.where(INCORRECT_ATTR="nomatter")
+        assert query_cache.info().currsize == 0
+
+    async def test_cache_is_bounded(self):
+        query_cache.clear()
+        maxsize = query_cache.maxsize
+        try:
+            query_cache.maxsize = 2
+            Comment.where(id=1)
+            Comment.where(rating=1)
+            Comment.where(body="cm")
+            assert query_cache.info().currsize == 2
+
+            # the first shape was evicted
+            Comment.where(id=2)
+            assert query_cache.info().hits == 0
+        finally:
+            query_cache.maxsize = maxsize
+            query_cache.clear()
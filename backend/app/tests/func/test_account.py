@@ -1,10 +1,18 @@
+import asyncio
+
 import pytest
-from sqlalchemy import select
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
 
-from models import Account
+from models import Account, AuthorizationData
+from db import sessions
 from tests.utils import get_account_data, faker
-from core.security import generate_confirmation_code
-from extra.enums import Roles
+import schemas
+from core.security import generate_confirmation_code, generate_token
+from core.principal import principals
+from core.settings import settings
+from extra.enums import CountStrategy, Roles
 
 
 async def _test_token(token, async_client):
@@ -47,6 +55,34 @@ class TestAccount:
     async def test_read_accounts(self, async_client):
         resp = await async_client.get('/accounts/')
         assert resp.status_code == 200
+        # few accounts are counted exactly
+        meta = resp.json()['meta']
+        assert meta['count'] == len(resp.json()['result'])
+        assert meta['count_strategy'] == CountStrategy.exact
+
+    @pytest.mark.parametrize('sort', ['id', '-email', '-created_at,email'])
+    async def test_read_accounts_by_cursor(self, async_client, sort):
+        resp = await async_client.get('/accounts/', params=dict(sort=sort, limit=100))
+        assert resp.status_code == 200
+        expected_ids = [a['id'] for a in resp.json()['result']]
+
+        ids, params = [], dict(sort=sort, limit=1)
+        for _ in expected_ids:
+            resp = await async_client.get('/accounts/', params=params)
+            assert resp.status_code == 200
+            ids += [a['id'] for a in resp.json()['result']]
+            if not (cursor := resp.json()['meta']['next_cursor']):
+                break
+            params.update(cursor=cursor)
+
+        assert ids == expected_ids
+
+    async def test_read_accounts_bad_params(self, async_client):
+        resp = await async_client.get('/accounts/', params=dict(sort='INCORRECT'))
+        assert resp.status_code == 400
+
+        resp = await async_client.get('/accounts/', params=dict(cursor='INCORRECT'))
+        assert resp.status_code == 400
 
     async def test_account_registration(self, async_client):
         resp = await async_client.post('/accounts/registration', json=TestAccount.data)
@@ -116,3 +152,144 @@ class TestAccount:
         resp = await async_client.delete(f'/accounts/{account.id}')
         assert resp.status_code == 200
         assert resp.json()['result'] is True
+
+
+def _auth_headers(account_id: int) -> dict:
+    token = generate_token(account_id)
+    return dict(Authorization=f'Bearer {token.access_token}')
+
+
+@pytest.mark.incremental
+@pytest.mark.asyncio
+class TestPrincipal:
+    async def test_principal_is_cached(self, async_client):
+        resp = await async_client.post('/accounts', json=get_account_data())
+        assert resp.status_code == 200
+        TestPrincipal.account_id = resp.json()['id']
+
+        resp = await async_client.get(
+            '/auth/user_is_auth', headers=_auth_headers(self.account_id)
+        )
+        assert resp.status_code == 200
+        principal = await principals.get(self.account_id)
+        assert principal.is_active
+        assert principal.has_role(Roles.customer)
+
+    async def test_cached_principal_is_used(self, async_client):
+        await principals.set(schemas.Principal(id=self.account_id, is_active=False))
+        resp = await async_client.get(
+            '/auth/user_is_auth', headers=_auth_headers(self.account_id)
+        )
+        assert resp.status_code == 400
+        await principals.invalidate(self.account_id)
+
+    async def test_update_invalidates_principal(self, async_client):
+        await async_client.get(
+            '/auth/user_is_auth', headers=_auth_headers(self.account_id)
+        )
+        assert await principals.get(self.account_id)
+
+        resp = await async_client.put(
+            f'/accounts/{self.account_id}', json=dict(fullname=faker.name())
+        )
+        assert resp.status_code == 200
+        assert await principals.get(self.account_id) is None
+
+    async def test_delete_invalidates_principal(self, async_client):
+        await async_client.get(
+            '/auth/user_is_auth', headers=_auth_headers(self.account_id)
+        )
+        assert await principals.get(self.account_id)
+
+        resp = await async_client.delete(f'/accounts/{self.account_id}')
+        assert resp.status_code == 200
+        assert await principals.get(self.account_id) is None
+
+        resp = await async_client.get(
+            '/auth/user_is_auth', headers=_auth_headers(self.account_id)
+        )
+        assert resp.json()['code'] == 'AccountNotFound'
+
+
+@pytest.fixture
+def statements():
+    calls = []
+
+    def on_execute(conn, cursor, statement, *args):
+        calls.append(statement)
+
+    event.listen(sessions.engine.sync_engine, 'before_cursor_execute', on_execute)
+    yield calls
+    event.remove(sessions.engine.sync_engine, 'before_cursor_execute', on_execute)
+
+
+@pytest.mark.asyncio
+class TestPrincipalInvalidation:
+    @pytest.fixture
+    async def account_id(self, async_client):
+        resp = await async_client.post('/accounts', json=get_account_data())
+        account_id = resp.json()['id']
+        await principals.set(schemas.Principal(id=account_id, is_active=True))
+        yield account_id
+        await principals.invalidate(account_id)
+
+    async def test_invalidated_on_commit(self, account_id):
+        async with sessions.lazy_session() as db:
+            account = await Account.where(id=account_id).one(db)
+            await account.update(db, fullname=faker.name())
+            # concurrent requests read the old row till commit
+            assert await principals.get(account_id)
+        assert await principals.get(account_id) is None
+
+    async def test_rollback_keeps_principal(self, account_id):
+        with pytest.raises(ZeroDivisionError):
+            async with sessions.lazy_session() as db:
+                account = await Account.where(id=account_id).one(db)
+                await account.update(db, fullname=faker.name())
+                1 / 0
+        assert await principals.get(account_id)
+
+    async def test_bulk_update(self, account_id, statements):
+        async with sessions.lazy_session() as db:
+            assert await Account.where(id=account_id)\
+                .update_all(db, fullname=faker.name()) == 1
+        # principal doesn't depend on columns of account,
+        # so affected accounts aren't selected
+        assert await principals.get(account_id)
+        assert not any('SELECT DISTINCT' in s for s in statements)
+
+        async with sessions.lazy_session() as db:
+            await AuthorizationData.where(account_id=account_id)\
+                .update_all(db, confirmed_at=None)
+            assert await principals.get(account_id)
+        assert await principals.get(account_id) is None
+
+    async def test_bulk_delete(self, account_id):
+        async with sessions.lazy_session() as db:
+            assert await Account.where(id=account_id).delete_all(db) == 1
+        assert await principals.get(account_id) is None
+
+    async def test_sync_session(self, account_id):
+        url = make_url(settings.SQLALCHEMY_DATABASE_URI)
+        engine = create_engine(url.set(drivername=url.get_backend_name()))
+        with Session(engine) as db, db.begin():
+            db.execute(
+                update(AuthorizationData)
+                .where(AuthorizationData.account_id == account_id)
+                .values(confirmed_at=None)
+            )
+        engine.dispose()
+        # commit of sync session doesn't await invalidation in redis
+        assert await principals.get(account_id)
+
+    async def test_replica_lag(self, account_id, monkeypatch):
+        monkeypatch.setattr(principals, 'replica_lag', 0.05)
+        async with sessions.lazy_session() as db:
+            account = await Account.where(id=account_id).one(db)
+            await account.update(db, fullname=faker.name())
+        assert await principals.get(account_id) is None
+
+        # the old row is read from lagging replica and cached again
+        await principals.set(schemas.Principal(id=account_id, is_active=True))
+        await asyncio.sleep(0.1)
+        assert await principals.get(account_id) is None
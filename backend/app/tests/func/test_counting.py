@@ -0,0 +1,133 @@
+import time
+
+import pytest
+from sqlalchemy import select
+
+import schemas
+from models import Account
+from extra.enums import CountStrategy
+from utils import counting, decorators, pagination
+from utils.cache import TTLCache
+from api.deps.deps_common import CommonQueryParams
+from tests.utils import get_account_data
+
+
+def test_count_query_drops_paging():
+    query = Account.sort('-id').limit(10).offset(10)
+    sql = str(counting.get_count_query(Account, query))
+    assert 'count(account.id)' in sql
+    assert 'ORDER BY' not in sql
+    assert 'LIMIT' not in sql
+    # eager loading isn't counted
+    assert 'auth_data' not in sql
+
+
+def test_count_query_of_joins_is_distinct():
+    query = Account.where(roles___name='Customer')
+    sql = str(counting.get_count_query(Account, query))
+    assert 'count(DISTINCT account.id)' in sql
+    assert 'role_1.name' in sql
+
+
+def test_signature_depends_on_filters():
+    def signature(**filters):
+        query = counting.get_count_query(Account, Account.where(**filters))
+        return counting.get_signature(query)
+
+    assert signature(id__in=[1, 2]) == signature(id__in=[1, 2])
+    assert signature(id__in=[1, 2]) != signature(id__in=[1, 3])
+    assert signature(id=1) != signature(email='1')
+
+
+def test_ttl_cache():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # the least recently used is evicted
+    assert cache.get('b') is None
+    assert len(cache) == 2
+
+    time.sleep(0.05)
+    assert cache.get('a') is None
+    assert cache.get('c', 'default') == 'default'
+
+
+@pytest.mark.asyncio
+class TestCount:
+    async def test_exact(self, db):
+        query = counting.get_count_query(Account)
+        total = len(await select(Account).all(db))
+        assert await counting.count(db, query) == (total, CountStrategy.exact)
+
+    async def test_estimate_of_small_list_is_exact(self, db):
+        query = counting.get_count_query(Account)
+        total, strategy = await counting.count(db, query, CountStrategy.estimate)
+        assert strategy == CountStrategy.exact
+        assert total == len(await select(Account).all(db))
+
+    async def test_cached(self, db):
+        counting.count_cache.clear()
+        query = counting.get_count_query(Account, Account.where(id__gt=0))
+        total, strategy = await counting.count(db, query, CountStrategy.cached)
+        assert strategy == CountStrategy.cached
+
+        # the same filters are not counted again
+        counting.count_cache.set(counting.get_signature(query), total + 1)
+        assert await counting.count(db, query, CountStrategy.cached) == (
+            total + 1, CountStrategy.cached
+        )
+        counting.count_cache.clear()
+
+
+@decorators.add_count(Account, schemas.Account, CountStrategy.window)
+async def read_accounts(db, params, filters=None):
+    return pagination.paginate(Account, params, filters), db
+
+
+@pytest.mark.asyncio
+class TestWindowCount:
+    async def test_page_and_count(self, db):
+        total = len(await select(Account).all(db))
+        resp = await read_accounts(db, CommonQueryParams(limit=1))
+        # roles are joined eagerly, but accounts are not multiplied
+        assert len(resp.result) == 1
+        assert resp.meta.count == total
+        assert resp.meta.count_strategy == CountStrategy.window
+
+    async def test_count_of_filters(self, db, async_client):
+        for _ in range(2):
+            resp = await async_client.post('/accounts', json=get_account_data())
+            assert resp.status_code == 200
+
+        first = await Account.sort('id').first(db)
+        resp = await read_accounts(
+            db, CommonQueryParams(), dict(id__gt=first.id)
+        )
+        assert resp.meta.count == len(resp.result)
+        assert first.id not in [account.id for account in resp.result]
+        assert resp.meta.count_strategy == CountStrategy.window
+
+    async def test_empty_page_is_counted(self, db):
+        total = len(await select(Account).all(db))
+        resp = await read_accounts(db, CommonQueryParams(skip=total))
+        assert resp.result == []
+        assert resp.meta.count == total
+        assert resp.meta.count_strategy == CountStrategy.exact
+
+    async def test_cursor_page_is_counted(self, db):
+        total = len(await select(Account).all(db))
+        resp = await read_accounts(db, CommonQueryParams(limit=1))
+        resp = await read_accounts(
+            db, CommonQueryParams(limit=1, cursor=resp.meta.next_cursor)
+        )
+        assert resp.meta.count == total
+        assert resp.meta.count_strategy == CountStrategy.exact
+
+    async def test_joined_filters_are_counted(self, db):
+        resp = await read_accounts(
+            db, CommonQueryParams(), dict(roles___name__isnull=False)
+        )
+        assert resp.meta.count == len(resp.result)
+        assert resp.meta.count_strategy == CountStrategy.exact
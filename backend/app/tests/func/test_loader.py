@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from models import Role
+from db import sessions
+from db.loader import Loader, get_loader
+
+
+@pytest.fixture
+def statements():
+    calls = []
+
+    def on_execute(conn, cursor, statement, *args):
+        calls.append(statement)
+
+    event.listen(sessions.engine.sync_engine, 'before_cursor_execute', on_execute)
+    yield calls
+    event.remove(sessions.engine.sync_engine, 'before_cursor_execute', on_execute)
+
+
+@pytest.mark.asyncio
+class TestLoader:
+    async def test_batching(self, statements):
+        async with sessions.lazy_session() as db:
+            loader = get_loader(db)
+            assert get_loader(db) is loader
+
+            customer, admin, missing = await asyncio.gather(
+                loader.load(Role, 'customer', column='guid'),
+                loader.load(Role, 'admin', column='guid'),
+                loader.load(Role, 'nobody', column='guid'),
+            )
+            assert (customer.guid, admin.guid, missing) == ('customer', 'admin', None)
+            assert len(statements) == 1
+
+            # cached for the loader lifetime, primary key is found
+            # in identity map
+            assert await loader.load(Role, 'admin', column='guid') is admin
+            assert await loader.load_many(Role, [admin.id, customer.id]) \
+                == [admin, customer]
+            assert len(statements) == 1
+
+    async def test_helpers_in_one_tick(self, statements):
+        async with sessions.lazy_session() as db:
+            async def helper(guid):
+                # helpers don't know about each other, but share the loader
+                role = await get_loader(db).load(Role, guid, column='guid')
+                return role.guid
+
+            assert await asyncio.gather(helper('admin'), helper('customer')) \
+                == ['admin', 'customer']
+            assert len(statements) == 1
+
+    async def test_errors(self):
+        async with sessions.lazy_session() as db:
+            loader = Loader(db)
+            with pytest.raises(KeyError):
+                await loader.load(Role, 'admin', column='not_a_column')
+            # failed loads aren't cached
+            with pytest.raises(KeyError):
+                await loader.load(Role, 'admin', column='not_a_column')
+            assert await loader.load(Role, 'admin', column='guid')
@@ -0,0 +1,197 @@
+"""
+Social logins against local mock OAuth servers.
+
+Timings of concurrent logins are checked by a benchmark: pytest -m benchmark
+"""
+
+import time
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import errors
+from sessions import sessions
+from services import socials
+from utils.oauth import OAuthProvider
+
+
+DELAY = 0.1
+LOGINS = 10
+
+
+class MockOAuthServer:
+    """OAuth service answering after delay, counts concurrent requests"""
+
+    def __init__(self, routes: dict[str, dict], delay: float = DELAY):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = Starlette(routes=[
+            Route(path, self.endpoint(data)) for path, data in routes.items()
+        ])
+
+    def endpoint(self, data: dict):
+        async def handle(request):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self.in_flight -= 1
+            return JSONResponse(data)
+        return handle
+
+
+def vk_server(**params) -> MockOAuthServer:
+    return MockOAuthServer({
+        '/access_token': dict(
+            access_token='token', expires_in=3600, user_id='1', email='vk@example.com'
+        ),
+    }, **params)
+
+
+def facebook_server(**params) -> MockOAuthServer:
+    return MockOAuthServer({
+        '/v8.0/oauth/access_token': dict(
+            access_token='token', token_type='bearer', expires_in=3600
+        ),
+        '/me': dict(id='2', name='User', email='fb@example.com'),
+    }, **params)
+
+
+@pytest.fixture
+async def use_provider(monkeypatch):
+    """Replaces provider of sessions by one with the transport"""
+    clients = []
+
+    def use_provider(attr: str, transport, **params) -> OAuthProvider:
+        clients.append(httpx.AsyncClient(transport=transport))
+        params = dict(dict(timeout=1, concurrency=LOGINS, retry_backoff=0), **params)
+        provider = OAuthProvider(attr, 'http://oauth', clients[-1], **params)
+        monkeypatch.setattr(sessions, attr, provider)
+        return provider
+
+    yield use_provider
+    for client in clients:
+        await client.aclose()
+
+
+@pytest.mark.asyncio
+class TestOAuthProviders:
+    async def test_vk(self, use_provider):
+        use_provider('vk_session', httpx.ASGITransport(app=vk_server().app))
+        schema = await socials.get_vk_user('code')
+        assert schema.get_type_and_user_id() == ('vk', '1')
+        assert schema.email == 'vk@example.com'
+
+    async def test_facebook(self, use_provider):
+        use_provider('facebook_session', httpx.ASGITransport(app=facebook_server().app))
+        schema = await socials.get_facebook_user('code')
+        assert schema.get_type_and_user_id() == ('facebook', '2')
+        assert schema.email == 'fb@example.com'
+
+    async def test_concurrent_logins(self, use_provider):
+        vk, facebook = vk_server(), facebook_server()
+        use_provider('vk_session', httpx.ASGITransport(app=vk.app))
+        use_provider('facebook_session', httpx.ASGITransport(app=facebook.app))
+
+        await asyncio.gather(
+            *(socials.get_vk_user(str(i)) for i in range(LOGINS)),
+            *(socials.get_facebook_user(str(i)) for i in range(LOGINS)),
+        )
+        # requests wait for servers concurrently
+        assert vk.max_in_flight == facebook.max_in_flight == LOGINS
+
+    @pytest.mark.benchmark
+    async def test_event_loop_isnt_blocked(self, use_provider):
+        vk, facebook = vk_server(), facebook_server()
+        use_provider('vk_session', httpx.ASGITransport(app=vk.app))
+        use_provider('facebook_session', httpx.ASGITransport(app=facebook.app))
+
+        ticks = 0
+
+        async def ticker(until: asyncio.Future):
+            nonlocal ticks
+            while not until.done():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        started = time.perf_counter()
+        logins = asyncio.gather(
+            *(socials.get_vk_user(str(i)) for i in range(LOGINS)),
+            *(socials.get_facebook_user(str(i)) for i in range(LOGINS)),
+        )
+        await asyncio.gather(logins, ticker(logins))
+        elapsed = time.perf_counter() - started
+
+        assert elapsed < DELAY * LOGINS
+        # facebook logins take two requests
+        assert ticks > DELAY * 2 / 0.01 / 2
+
+    async def test_concurrency_limit(self, use_provider):
+        vk = vk_server()
+        use_provider('vk_session', httpx.ASGITransport(app=vk.app), concurrency=2)
+        await asyncio.gather(*(socials.get_vk_user(str(i)) for i in range(6)))
+        assert vk.max_in_flight == 2
+
+    async def test_retry(self, use_provider):
+        vk = vk_server(delay=0)
+        app_transport = httpx.ASGITransport(app=vk.app)
+        failures = [httpx.ConnectError('refused'), httpx.Response(503)]
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if failures:
+                failure = failures.pop(0)
+                if isinstance(failure, Exception):
+                    raise failure
+                return failure
+            async with httpx.AsyncClient(transport=app_transport) as client:
+                return await client.get(request.url)
+
+        use_provider('vk_session', httpx.MockTransport(handler))
+        schema = await socials.get_vk_user('code')
+        assert schema.email == 'vk@example.com'
+        assert not failures
+
+    async def test_errors_are_not_retried(self, use_provider):
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            # OAuth code could be used by the request
+            raise httpx.ReadTimeout('timeout', request=request)
+
+        use_provider('vk_session', httpx.MockTransport(handler))
+        with pytest.raises(errors.SocialLoginFailed):
+            await socials.get_vk_user('code')
+        assert len(calls) == 1
+
+    @pytest.mark.parametrize('status', [502, 504])
+    async def test_gateway_errors_are_not_retried(self, use_provider, status):
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            # the service could exchange the code behind the gateway
+            return httpx.Response(status)
+
+        use_provider('vk_session', httpx.MockTransport(handler))
+        with pytest.raises(errors.SocialLoginFailed):
+            await socials.get_vk_user('code')
+        assert len(calls) == 1
+
+    async def test_retries_are_limited(self, use_provider):
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(503)
+
+        use_provider('vk_session', httpx.MockTransport(handler), retries=2)
+        with pytest.raises(errors.SocialLoginFailed):
+            await socials.get_vk_user('code')
+        assert len(calls) == 3
@@ -1,12 +1,19 @@
 """Demonstrates how to use AllFeaturesMixin with patched SQLAlchemy."""
 
+import time
+import inspect
+import statistics
+
 import pytest
 import sqlalchemy as sa
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 
 from db.mixins import AllFeaturesMixin
+from db.orm.utils import get_model_from_query
+from models import Account, AuthorizationData, account_role
 from core.settings import settings
 
 from tests.func.mixins.utils import in_tx
@@ -131,3 +138,162 @@ class TestORM:
         result = await Post.sort('-rating', 'user___name').all(db)
 
         assert result == [post1, post2]
+
+
+# Maximum allowed overhead of patched terminal method
+# over raw session.execute() per call, in seconds.
+TERMINAL_METHOD_OVERHEAD_BUDGET = 0.0005
+
+
+@pytest.mark.asyncio
+class TestTerminalMethods:
+    async def test_no_stack_inspection(self, db, monkeypatch):
+        def stack(*args, **kwargs):
+            raise AssertionError('terminal method inspects the stack')
+
+        monkeypatch.setattr(inspect, 'stack', stack)
+        monkeypatch.setattr(inspect, 'currentframe', stack)
+        user = await User.create(db, name='no_stack')
+        query = sa.select(User).where(User.id == user.id)
+
+        assert await query.one(db) == user
+        assert await query.one_or_none(db) == user
+        assert await query.all(db) == [user]
+        assert await query.first(db) == user
+        assert (await query.scalars(db)).all() == [user]
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+class TestTerminalMethodsOverhead:
+    calls = 200
+
+    async def _measure(self, coro_factory) -> float:
+        timings = []
+        for _ in range(self.calls):
+            started = time.perf_counter()
+            await coro_factory()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    async def test_overhead(self, db):
+        user = await User.create(db, name='overhead')
+        query = sa.select(User).where(User.id == user.id)
+
+        async def raw():
+            result = await db.execute(query)
+            return result.unique().scalar_one()
+
+        async def patched():
+            return await query.one(db)
+
+        assert await patched() == await raw() == user
+
+        raw_time = await self._measure(raw)
+        patched_time = await self._measure(patched)
+
+        assert patched_time - raw_time < TERMINAL_METHOD_OVERHEAD_BUDGET
+
+
+@pytest.mark.asyncio
+class TestIdentityMap:
+
+    @pytest.fixture
+    def statements(self):
+        calls = []
+
+        def on_execute(conn, cursor, statement, *args):
+            calls.append(statement)
+
+        sa.event.listen(engine.sync_engine, 'before_cursor_execute', on_execute)
+        yield calls
+        sa.event.remove(engine.sync_engine, 'before_cursor_execute', on_execute)
+
+    async def test_pk_lookup(self, db, statements):
+        user = await User.create(db, name='identity')
+        statements.clear()
+
+        assert await User.where(id=user.id).one(db) is user
+        assert await User.where(id__exact=user.id).one_or_none(db) is user
+        assert await User.find(db, user.id) is user
+        assert not statements
+
+        with pytest.raises(sa.exc.NoResultFound):
+            await User.where(id=-1).one(db)
+        assert await User.where(id=-1).one_or_none(db) is None
+
+    async def test_not_pk_lookup(self, db, statements):
+        user = await User.create(db, name='identity2')
+        statements.clear()
+
+        assert await User.where(id=user.id, name='identity2').one(db) is user
+        assert await User.where(id=user.id).filter(User.name == 'x')\
+            .one_or_none(db) is None
+        assert await User.where(id=user.id).with_subquery('posts').one(db) is user
+        assert len(statements) == 4
+
+    async def test_projection(self, db, statements):
+        user = await User.create(db, name='identity3')
+        statements.clear()
+
+        query = User.where(id=user.id)
+        assert await query.with_only_columns(User.name).one(db) == 'identity3'
+        assert await query.with_only_columns(User.name)\
+            .one_or_none(db) == 'identity3'
+        assert await query.add_columns(User.name).one(db) is user
+        assert len(statements) == 3
+
+
+@pytest.mark.asyncio
+class TestBulkUpdateDelete:
+
+    async def test_update_all(self, db):
+        bulk = await User.create(db, name='bulk')
+        posts = [
+            await Post.create(db, body=f'bulk {i}', rating=i, user=bulk)
+            for i in range(3)
+        ]
+
+        assert await Post.where(body__like='bulk %', rating__gt=0)\
+            .update_all(db, rating=10) == 2
+        # loaded instances are synchronized
+        assert [post.rating for post in posts] == [0, 10, 10]
+
+        assert await Post.where(user___name='bulk').update_all(db, rating=5) == 3
+        assert [post.rating for post in posts] == [5, 5, 5]
+
+        assert await Post.where(rating=-1).update_all(db, rating=0) == 0
+
+    async def test_delete_all(self, db):
+        doomed = await User.create(db, name='doomed')
+        for i in range(3):
+            await Post.create(db, body=f'doomed {i}', rating=i, user=doomed)
+
+        assert await Post.where(user___name='doomed', rating__lt=2)\
+            .delete_all(db) == 2
+        assert await Post.where(user___name='doomed').count(db) == 1
+        assert await Post.where(body='doomed 2').delete_all(db) == 1
+        assert await Post.where(user___name='doomed').count(db) == 0
+
+
+class TestModelFromQuery:
+
+    def test_table(self):
+        assert get_model_from_query(sa.select(Account)) is Account
+        assert get_model_from_query(sa.select(Account.id, Account.email)) is Account
+
+    def test_join(self):
+        query = sa.select(AuthorizationData).join(AuthorizationData.account)
+        assert get_model_from_query(query) is AuthorizationData
+
+    def test_alias(self):
+        alias = sa.orm.aliased(Account)
+        model = get_model_from_query(sa.select(alias))
+        assert sa.inspect(model).mapper.class_ is Account
+        assert 'account_1.email' in str(
+            sa.select(alias).order_by(*model.order_expr('email'))
+        )
+
+    def test_not_a_model(self):
+        with pytest.raises(InvalidRequestError):
+            get_model_from_query(sa.select(account_role))
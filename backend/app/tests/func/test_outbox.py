@@ -0,0 +1,198 @@
+import json
+
+import httpx
+import pytest
+from sqlalchemy import delete, select
+
+from models import EmailOutbox
+from db import sessions
+from core.settings import settings
+from extra.enums import OutboxStatus
+from services.mailing import messages
+from services.mailing.outbox import OutboxDispatcher
+from services.mailing.sender import send_batch
+from tests.utils import get_account_data
+
+
+class SendGridStub:
+    """Local stub of SendGrid API, which fails the first `failures` requests"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(json.loads(request.content))
+        if self.failures:
+            self.failures -= 1
+            return httpx.Response(503, text='unavailable')
+        return httpx.Response(202)
+
+    @property
+    def recipients(self) -> list[str]:
+        return [
+            to['email']
+            for body in self.requests
+            for p in body['personalizations']
+            for to in p['to']
+        ]
+
+
+@pytest.fixture
+async def outbox():
+    async with sessions.lazy_session() as db:
+        await db.execute(delete(EmailOutbox))
+    yield
+    async with sessions.lazy_session() as db:
+        await db.execute(delete(EmailOutbox))
+
+
+@pytest.fixture
+def send_mode(monkeypatch):
+    monkeypatch.setattr(settings, 'EMAIL_SEND_MODE', True)
+
+
+@pytest.fixture
+async def get_dispatcher():
+    """Factory of dispatchers sending emails to the stub"""
+    clients = []
+
+    def get_dispatcher(stub: SendGridStub, **params) -> OutboxDispatcher:
+        clients.append(httpx.AsyncClient(transport=httpx.MockTransport(stub)))
+        return OutboxDispatcher(client=clients[-1], retry_backoff=0, **params)
+
+    yield get_dispatcher
+    for client in clients:
+        await client.aclose()
+
+
+async def get_outbox() -> list[EmailOutbox]:
+    async with sessions.lazy_session() as db:
+        return (await db.execute(
+            select(EmailOutbox).order_by(EmailOutbox.id)
+        )).scalars().all()
+
+
+@pytest.mark.asyncio
+class TestOutbox:
+    async def test_enqueue_in_transaction(self, outbox):
+        with pytest.raises(ZeroDivisionError):
+            async with sessions.lazy_session() as db:
+                await messages.PasswordWasChangedMessage(
+                    email='rollback@example.com'
+                ).enqueue(db)
+                1 / 0
+        assert await get_outbox() == []
+
+        async with sessions.lazy_session() as db:
+            await messages.PasswordWasChangedMessage(
+                email='commit@example.com'
+            ).enqueue(db)
+        [email] = await get_outbox()
+        assert email.message == 'PasswordWasChangedMessage'
+        assert email.data['email'] == 'commit@example.com'
+        assert email.status == OutboxStatus.pending
+
+    async def test_registration_enqueues(
+        self, outbox, send_mode, get_dispatcher, async_client
+    ):
+        data = get_account_data()
+        resp = await async_client.post('/accounts/registration', json=dict(
+            email=data['email'], password=data['password'],
+        ))
+        assert resp.status_code == 200
+
+        [email] = await get_outbox()
+        assert email.message == 'ConfirmAccountMessage'
+        assert email.data['email'] == data['email']
+
+        stub = SendGridStub()
+        assert await get_dispatcher(stub).dispatch() == 1
+        assert stub.recipients == [data['email']]
+        [personalization] = stub.requests[0]['personalizations']
+        assert 'confirm/account?code=' in personalization['substitutions']['-url-']
+
+    async def test_retry(self, outbox, send_mode, get_dispatcher):
+        async with sessions.lazy_session() as db:
+            for i in range(3):
+                await messages.PasswordWasChangedMessage(
+                    email=f'retry{i}@example.com'
+                ).enqueue(db)
+
+        stub = SendGridStub(failures=1)
+        dispatcher = get_dispatcher(stub, batch_size=2)
+        # the same content, so both emails are in one failed request
+        assert await dispatcher.dispatch() == 2
+        first, second, third = await get_outbox()
+        assert (first.status, first.attempts) == (OutboxStatus.pending, 1)
+        assert (second.status, second.attempts) == (OutboxStatus.pending, 1)
+        assert 'unavailable' in first.last_error
+        assert third.attempts == 0
+
+        assert await dispatcher.dispatch() == 2
+        assert await dispatcher.dispatch() == 1
+        assert await dispatcher.dispatch() == 0
+        assert [e.status for e in await get_outbox()] == [OutboxStatus.sent] * 3
+        assert len(stub.requests) == 3
+        assert sorted(stub.recipients) == [
+            'retry0@example.com',
+            'retry0@example.com',
+            'retry1@example.com',
+            'retry1@example.com',
+            'retry2@example.com',
+        ]
+
+    async def test_max_attempts(self, outbox, send_mode, get_dispatcher):
+        async with sessions.lazy_session() as db:
+            await messages.PasswordWasChangedMessage(
+                email='failed@example.com'
+            ).enqueue(db)
+
+        stub = SendGridStub(failures=10)
+        dispatcher = get_dispatcher(stub, max_attempts=2)
+        assert await dispatcher.dispatch() == 1
+        assert await dispatcher.dispatch() == 1
+        assert await dispatcher.dispatch() == 0
+
+        [email] = await get_outbox()
+        assert (email.status, email.attempts) == (OutboxStatus.failed, 2)
+        assert len(stub.requests) == 2
+
+    async def test_backoff(self):
+        dispatcher = OutboxDispatcher(retry_backoff=10, max_retry_backoff=60)
+        assert [dispatcher.get_backoff(n).seconds for n in range(1, 5)] \
+            == [10, 20, 40, 60]
+
+
+@pytest.mark.asyncio
+class TestSendBatch:
+    async def test_personalizations(self, send_mode, monkeypatch):
+        monkeypatch.setattr(settings, 'SEND_GRID_MAX_PERSONALIZATIONS', 2)
+        batch = [
+            messages.ConfirmAccountMessage(account_id=1, email='a@example.com'),
+            messages.ConfirmAccountMessage(account_id=2, email='b@example.com'),
+            messages.ConfirmAccountMessage(account_id=3, email='c@example.com'),
+            # the same recipient isn't repeated in one request
+            messages.ConfirmAccountMessage(account_id=4, email='a@example.com'),
+            messages.PasswordWasChangedMessage(email='d@example.com'),
+        ]
+        stub = SendGridStub(failures=1)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(stub)) as client:
+            results = await send_batch(batch, client, concurrency=1)
+
+        assert [len(r['personalizations']) for r in stub.requests] == [2, 2, 1]
+        # only the first request is failed
+        assert [bool(error) for error in results] == [True, True, False, False, False]
+
+        # substitutions give the same content, as the message itself
+        sent = [
+            (personalization, body['content'][0]['value'])
+            for body in stub.requests[1:]
+            for personalization in body['personalizations']
+        ]
+        for message, (personalization, content) in zip(batch[2:], sent):
+            for tag, value in personalization.get('substitutions', {}).items():
+                content = content.replace(tag, value)
+            assert personalization['to'][0]['email'] == message.schema.email
+            assert personalization['subject'] == message.get_subject()
+            assert content == message.get_payload()['value']
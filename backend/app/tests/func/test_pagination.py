@@ -0,0 +1,72 @@
+"""
+Benchmark of keyset pagination against offset on a deep page.
+
+It seeds ROWS accounts, so it isn't run by default: pytest -m benchmark
+"""
+
+import time
+import statistics
+
+import pytest
+from sqlalchemy import insert
+
+from models import Account
+from db import sessions
+from utils import pagination
+from api.deps.deps_common import CommonQueryParams
+
+
+ROWS = 25_000
+LIMIT = 20
+PAGE = 1000
+RUNS = 10
+
+
+@pytest.fixture(scope="class")
+async def accounts_db(async_client):
+    # own transaction, rows aren't written by the session of the whole run
+    async with sessions.async_session() as db:
+        await db.execute(insert(Account), [
+            dict(email=f'pagination_{i}@example.com', fullname=f'Pagination {i}')
+            for i in range(ROWS)
+        ])
+        yield db
+        await db.rollback()
+
+
+async def _measure(db, params: CommonQueryParams) -> float:
+    timings = []
+    for _ in range(RUNS):
+        query = pagination.paginate(Account, params).query
+        started = time.perf_counter()
+        accounts = await query.all(db)
+        timings.append(time.perf_counter() - started)
+        assert len(accounts) == LIMIT
+    return statistics.median(timings)
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+class TestDeepPage:
+    # sorts by indexed not null columns, which keyset can seek
+    @pytest.mark.parametrize('sort', ['id', '-id'])
+    async def test_latency(self, accounts_db, sort):
+        db = accounts_db
+        skip = (PAGE - 1) * LIMIT
+        offset_params = CommonQueryParams(skip=skip, limit=LIMIT, sort=sort)
+        offset_time = await _measure(db, offset_params)
+
+        # cursor of the previous page
+        page = pagination.paginate(
+            Account, CommonQueryParams(skip=skip - LIMIT, limit=LIMIT, sort=sort)
+        )
+        cursor = page.next_cursor(await page.query.all(db))
+        cursor_params = CommonQueryParams(limit=LIMIT, sort=sort, cursor=cursor)
+        cursor_time = await _measure(db, cursor_params)
+
+        # the same page
+        offset_page = await pagination.paginate(Account, offset_params).query.all(db)
+        cursor_page = await pagination.paginate(Account, cursor_params).query.all(db)
+        assert cursor_page == offset_page
+
+        assert cursor_time < offset_time
@@ -0,0 +1,67 @@
+"""
+Load test: a burst of logins doesn't stall other requests with bcrypt.
+
+Latency is compared by a benchmark: pytest -m benchmark
+"""
+
+import time
+import asyncio
+import statistics
+
+import pytest
+
+from core.security import get_password_hash, password_hasher
+from tests.utils import get_account_data
+
+
+BURST = 16
+
+
+async def _probe(async_client, until: asyncio.Future) -> list[float]:
+    """Latencies of an unrelated endpoint until the future is done"""
+    timings = []
+    while not until.done() or len(timings) < 10:
+        started = time.perf_counter()
+        resp = await async_client.get('/auth/user_is_auth')
+        timings.append(time.perf_counter() - started)
+        assert resp.status_code == 200
+    return timings
+
+
+@pytest.mark.asyncio
+class TestLoginBurst:
+    @pytest.mark.benchmark
+    async def test_latency_of_other_requests(self, async_client):
+        data = get_account_data()
+        resp = await async_client.post('/accounts', json=data)
+        assert resp.status_code == 200
+
+        started = time.perf_counter()
+        get_password_hash(data['password'])
+        hashing_time = time.perf_counter() - started
+
+        credentials = dict(login=data['email'], password=data['password'])
+        burst = asyncio.gather(*(
+            async_client.post('/auth/access-token', json=credentials)
+            for _ in range(BURST)
+        ))
+        timings = await _probe(async_client, burst)
+        assert all(resp.status_code == 200 for resp in await burst)
+
+        p99 = statistics.quantiles(timings, n=100)[98]
+        # with bcrypt in event loop requests wait for it
+        assert p99 < hashing_time
+
+    async def test_queue_is_bounded(self, async_client, monkeypatch):
+        data = get_account_data()
+        resp = await async_client.post('/accounts', json=data)
+        assert resp.status_code == 200
+
+        monkeypatch.setattr(password_hasher, 'queue_size', 0)
+        monkeypatch.setattr(password_hasher, 'concurrency', 1)
+        credentials = dict(login=data['email'], password=data['password'])
+        responses = await asyncio.gather(*(
+            async_client.post('/auth/access-token', json=credentials)
+            for _ in range(2)
+        ))
+        assert 'ServerIsBusy' in [resp.json().get('code') for resp in responses]
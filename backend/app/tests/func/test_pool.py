@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.settings import Settings, settings
+from db.pool import MeasuredQueuePool, get_pool_stats
+
+
+def test_pool_params_fit_connections_budget():
+    params = Settings(
+        DB_POOL_SIZE=10, DB_MAX_OVERFLOW=10, DB_MAX_CONNECTIONS=24, WEB_CONCURRENCY=4
+    ).pool_params
+    assert params['pool_size'] == 6
+    assert params['max_overflow'] == 0
+
+    params = Settings(
+        DB_POOL_SIZE=2, DB_MAX_OVERFLOW=10, DB_MAX_CONNECTIONS=24, WEB_CONCURRENCY=4
+    ).pool_params
+    assert params['pool_size'] == 2
+    assert params['max_overflow'] == 4
+
+
+@pytest.mark.asyncio
+class TestPoolStats:
+    async def test_wait_stats(self):
+        engine = create_async_engine(
+            settings.SQLALCHEMY_DATABASE_URI,
+            poolclass=MeasuredQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.1,
+        )
+        async with engine.connect() as conn:
+            await conn.execute(text('SELECT 1'))
+            stats = get_pool_stats(engine)
+            assert stats['checked_out'] == 1
+            assert stats['checkouts'] == 1
+
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+
+        stats = get_pool_stats(engine)
+        assert stats['checked_out'] == 0
+        assert stats['timeouts'] == 1
+        assert stats['wait_time_max'] >= 0.1
+        await engine.dispose()
+
+    async def test_endpoint(self, async_client):
+        resp = await async_client.get('/metrics/pool')
+        assert resp.status_code == 200
+        assert resp.json()['pid']
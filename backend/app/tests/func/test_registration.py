@@ -0,0 +1,186 @@
+"""
+Statements issued by Account.create per registration.
+
+Registrations per second are compared by a benchmark: pytest -m benchmark
+"""
+
+import time
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import selectinload
+
+import schemas
+from models import Account, AuthorizationData, Role
+import models.account
+from db import sessions
+from extra.enums import Roles, RegistrationTypes, SocialTypes
+from services.social import social
+from services.social.state import social_states
+from tests.utils import get_account_data
+
+
+REGISTRATIONS = 100
+
+
+@pytest.fixture
+def statements():
+    calls = []
+
+    def on_execute(conn, cursor, statement, *args):
+        calls.append(statement)
+
+    event.listen(sessions.engine.sync_engine, 'before_cursor_execute', on_execute)
+    yield calls
+    event.remove(sessions.engine.sync_engine, 'before_cursor_execute', on_execute)
+
+
+@pytest.fixture
+def fast_hashing(monkeypatch):
+    # bcrypt would be measured instead of database
+    async def get_password_hash_async(password):
+        return f'hashed {password}'
+
+    monkeypatch.setattr(
+        models.account, 'get_password_hash_async', get_password_hash_async
+    )
+
+
+@pytest.mark.asyncio
+class TestRegistration:
+    async def test_created_rows(self, fast_hashing):
+        email = get_account_data()['email']
+        async with sessions.lazy_session() as db:
+            account = await Account.create(
+                session=db,
+                email=email,
+                password='password',
+                registration_type=RegistrationTypes.social,
+                social_type=SocialTypes.vk,
+                external_id='42',
+            )
+            created = dict(
+                id=account.id,
+                roles=[r.name for r in account.roles],
+                auths=[(a.login, a.password, a.account_id) for a in account.auths],
+            )
+            assert account.created_at and not account.is_active
+
+        async with sessions.lazy_session() as db:
+            account = await Account.where(email=email).one(db)
+            auths = (await db.execute(
+                select(AuthorizationData)
+                .where(AuthorizationData.account_id == account.id)
+                .options(selectinload(AuthorizationData.socials))
+            )).scalars().all()
+            assert created == dict(
+                id=account.id,
+                roles=[Roles.customer],
+                auths=[(email, 'hashed password', account.id)],
+            )
+            socials = [
+                (s.social_type, s.external_id, s.auth_data_id) for s in auths[0].socials
+            ]
+            assert socials == [(SocialTypes.vk, '42', auths[0].id)]
+
+    async def test_role_is_cached(self, fast_hashing, statements):
+        async with sessions.lazy_session() as db:
+            await Role.get_cached(db, Roles.customer)
+        statements.clear()
+
+        async with sessions.lazy_session() as db:
+            account = await Account.create(
+                session=db, email=get_account_data()['email'], password='password',
+            )
+            assert [r.name for r in account.roles] == [Roles.customer]
+        assert not any('FROM role' in statement for statement in statements)
+
+    async def test_statements_per_registration(self, fast_hashing, statements):
+        async with sessions.lazy_session() as db:
+            await Role.get_cached(db, Roles.customer)
+        statements.clear()
+
+        for _ in range(REGISTRATIONS):
+            async with sessions.lazy_session() as db:
+                data = get_account_data()
+                await Account.create(
+                    session=db, email=data['email'], password=data['password'],
+                )
+
+        per_registration = len(statements) / REGISTRATIONS
+        if sessions.engine.dialect.name == 'postgresql':
+            # account, role, auth data in one statement
+            assert per_registration == 1
+
+    async def test_role_cache_is_reset(self):
+        async with sessions.lazy_session() as db:
+            role = await Role.get_cached(db, Roles.admin)
+            assert Role._cache
+
+            await role.update(db, guid=role.guid)
+            assert Role._cache == {}
+
+            await Role.get_cached(db, Roles.admin)
+            await db.delete(role)
+            await db.flush()
+            assert Role._cache == {}
+            await db.rollback()
+
+
+@pytest.mark.asyncio
+class TestSocialRegistration:
+    async def test_statements_per_registration(self, fast_hashing, statements):
+        email = get_account_data()['email']
+        vk = schemas.RegistrationFromSocialVK(
+            access_token='token', expires_in=3600, user_id='4242', email=email,
+        )
+        async with sessions.lazy_session() as db:
+            await social.registration(db, vk, 'vk_code')
+        account_id = vk.application_account_id
+        assert account_id
+
+        # returning user: integration with its auth data
+        statements.clear()
+        async with sessions.lazy_session() as db:
+            await social.registration(db, vk, 'vk_code')
+        assert vk.application_account_id == account_id
+        assert len(statements) == 1
+
+        # another social with the same email: integration, auth data, insert
+        facebook = schemas.RegistrationFromSocialFacebook(
+            id='4242', name='Social User', email=email,
+        )
+        statements.clear()
+        async with sessions.lazy_session() as db:
+            await social.registration(db, facebook, 'facebook_code')
+        assert facebook.application_account_id == account_id
+        selects = [s for s in statements if s.lstrip().startswith('SELECT')]
+        assert len(selects) == 2
+
+        await social_states.clear()
+
+
+async def _register(count: int, reset_cache: bool) -> float:
+    """Registrations per second"""
+    started = time.perf_counter()
+    for _ in range(count):
+        if reset_cache:
+            Role._cache = {}
+        async with sessions.lazy_session() as db:
+            data = get_account_data()
+            await Account.create(
+                session=db, email=data['email'], password=data['password'],
+            )
+    return count / (time.perf_counter() - started)
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+class TestRegistrationsPerSecond:
+    async def test_cached_role(self, fast_hashing):
+        async with sessions.lazy_session() as db:
+            await Role.get_cached(db, Roles.customer)
+
+        uncached = await _register(REGISTRATIONS, reset_cache=True)
+        cached = await _register(REGISTRATIONS, reset_cache=False)
+        assert cached > uncached
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import delete, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from models import Account, Role
+from db import sessions
+from db.pool import MeasuredQueuePool
+from db.replicas import ReplicaSet
+from core.settings import settings
+from extra.enums import ReplicaSelection, Roles
+
+
+def _create_engine(url=settings.SQLALCHEMY_DATABASE_URI):
+    # replicas are engines of the database of tests
+    return create_async_engine(url, poolclass=MeasuredQueuePool)
+
+
+@pytest.fixture
+def replica_engines():
+    return [_create_engine(), _create_engine()]
+
+
+@pytest.mark.asyncio
+class TestReplicaSet:
+    async def test_round_robin(self, replica_engines):
+        replicas = ReplicaSet(replica_engines)
+        selected = [replicas.select() for _ in range(4)]
+        assert selected[0] is not selected[1]
+        assert selected[:2] == selected[2:]
+        await replicas.dispose()
+
+    async def test_least_connections(self, replica_engines):
+        replicas = ReplicaSet(replica_engines, ReplicaSelection.least_connections)
+        busy, idle = replica_engines
+        async with busy.connect() as conn:
+            await conn.execute(text('SELECT 1'))
+            assert all(replicas.select() is idle for _ in range(3))
+        await replicas.dispose()
+
+    async def test_failed_replica_is_skipped(self, replica_engines):
+        url = make_url(settings.SQLALCHEMY_DATABASE_URI)
+        broken = _create_engine(url.set(database=f'{url.database}_not_exists/replica'))
+        replicas = ReplicaSet([broken, replica_engines[0]])
+        with pytest.raises(Exception):
+            async with broken.connect():
+                pass
+
+        assert all(replicas.select() is replica_engines[0] for _ in range(3))
+        replicas.retry_after = 0
+        assert broken in [replicas.select() for _ in range(2)]
+
+        # primary is used without replicas
+        replicas.engines = [broken]
+        replicas.retry_after = 60
+        assert replicas.select() is None
+        await replicas.dispose()
+
+
+@pytest.mark.asyncio
+class TestReadOnlySession:
+    async def test_replica_is_used(self, replica_engines, monkeypatch):
+        monkeypatch.setattr(sessions, 'replicas', ReplicaSet(replica_engines))
+        async with sessions.in_transaction(read_only=True) as db:
+            assert db.bind in replica_engines
+            assert await db.scalar(text('SELECT 1')) == 1
+        await sessions.replicas.dispose()
+
+    async def test_primary_is_used_without_replicas(self):
+        async with sessions.in_transaction(read_only=True) as db:
+            assert db.bind is sessions.engine
+            assert await Role.where(name=Roles.admin).one(db)
+
+    async def test_writes_are_forbidden(self):
+        async with sessions.in_transaction(read_only=True) as db:
+            db.add(Role(name=Roles.admin, guid='admin'))
+            with pytest.raises(InvalidRequestError):
+                await db.flush()
+            await db.rollback()
+
+            with pytest.raises(InvalidRequestError):
+                await delete(Account).filter_by(id=0).execute(db)
@@ -0,0 +1,109 @@
+import pytest
+from sqlalchemy import event, select
+
+from models import Role
+from extra.enums import Roles
+from db import sessions
+from db.pool import hold_stats
+from core.principal import principals
+from tests.utils import get_account_data
+
+
+@pytest.fixture
+def commits():
+    """Commits of the primary engine during the test"""
+    calls = []
+
+    def on_commit(conn):
+        calls.append(conn)
+
+    event.listen(sessions.engine.sync_engine, 'commit', on_commit)
+    yield calls
+    event.remove(sessions.engine.sync_engine, 'commit', on_commit)
+
+
+@pytest.mark.asyncio
+class TestLazySession:
+    async def test_no_statements(self, commits):
+        async with sessions.lazy_session(label='test_no_statements') as db:
+            assert not db.in_transaction()
+        assert 'test_no_statements' not in hold_stats
+        assert not commits
+
+    async def test_reads_are_not_committed(self, commits):
+        async with sessions.lazy_session(label='test_reads') as db:
+            roles = (await db.execute(select(Role))).scalars().all()
+        assert roles
+        assert hold_stats['test_reads'].holds == 1
+        assert not commits
+
+    async def test_writes_are_committed(self, commits):
+        async with sessions.lazy_session() as db:
+            role = await Role.where(name=Roles.customer).one(db)
+            guid = role.guid
+            await role.update(db, guid='test_writes')
+        assert commits
+
+        async with sessions.lazy_session() as db:
+            role = await Role.where(name=Roles.customer).one(db)
+            assert role.guid == 'test_writes'
+            await role.update(db, guid=guid)
+
+    async def test_release(self):
+        async with sessions.lazy_session(label='test_release') as db:
+            await Role.where(name=Roles.customer).one(db)
+            await sessions.release(db)
+            assert not db.in_transaction()
+            assert hold_stats['test_release'].holds == 1
+
+            # session takes new connection after release
+            await Role.where(name=Roles.customer).one(db)
+        assert hold_stats['test_release'].holds == 2
+
+    async def test_instances_after_release(self, commits):
+        async with sessions.lazy_session() as db:
+            role = await Role.where(name=Roles.customer).one(db)
+            await sessions.release(db)
+
+            # not expired, so no statement is needed
+            assert role.name == Roles.customer
+            # lazy load takes new connection
+            accounts = await db.run_sync(lambda _: role.accounts)
+            assert isinstance(accounts, list)
+            assert role in db
+        assert not commits
+
+    async def test_endpoint(self, async_client):
+        resp = await async_client.post('/accounts/registration', json=dict(
+            email=get_account_data()['email'], password='password'
+        ))
+        assert resp.status_code == 200
+
+        resp = await async_client.get('/metrics/connections')
+        assert resp.status_code == 200
+        stats = {x['endpoint']: x for x in resp.json()}
+        registration = 'api.endpoints.general.accounts.account_registration'
+        assert stats[registration]['holds'] >= 1
+
+    async def test_request_shares_session(self, async_client):
+        await principals.clear()
+        label = 'api.endpoints.general.accounts.get_me'
+        holds = hold_stats[label].holds if label in hold_stats else 0
+        statements = []
+
+        def on_execute(conn, cursor, statement, *args):
+            if "FROM account " in statement:
+                statements.append(statement)
+
+        event.listen(sessions.engine.sync_engine, 'before_cursor_execute', on_execute)
+        try:
+            resp = await async_client.get('/accounts/me')
+        finally:
+            event.remove(
+                sessions.engine.sync_engine, 'before_cursor_execute', on_execute
+            )
+        assert resp.status_code == 200
+        # the account is loaded once by auth dependency and taken
+        # from the identity map by the handler
+        assert len(statements) == 1
+        assert hold_stats[label].holds == holds + 1
@@ -0,0 +1,120 @@
+import asyncio
+import fnmatch
+import time
+
+import pytest
+from aiocache import Cache
+from aiocache.serializers import MsgPackSerializer
+
+import schemas
+from services.social import state
+from services.social.state import LocalStateStore, RedisStateStore, social_states
+from utils.cache import REDIS_CLEAR, REDIS_POP
+
+
+def get_schema(**fields) -> schemas.RegistrationFromSocialVK:
+    return schemas.RegistrationFromSocialVK(
+        access_token='token', expires_in=3600, user_id='42', **fields
+    )
+
+
+@pytest.fixture
+async def redis_store():
+    """
+    Store on memory cache with serializer of redis, which runs scripts
+    of redis commands in Python
+    """
+    cache = Cache(
+        Cache.MEMORY,
+        namespace='social:',
+        serializer=MsgPackSerializer(encoding=None, use_list=True),
+    )
+    memory = cache.raw
+
+    async def raw(command, script, keys, args=()):
+        assert command == 'eval'
+        if script == REDIS_POP:
+            [key] = keys
+            # no await between get and delete, like in redis
+            return await memory('pop', key, None)
+        if script == REDIS_CLEAR:
+            [pattern] = args
+            matched = fnmatch.filter(list(await memory('keys')), pattern)
+            for key in matched:
+                await memory('pop', key)
+            return len(matched)
+        raise AssertionError(f'unexpected script {script}')
+
+    cache.raw = raw
+    await cache.set('other', 'value', namespace='principal:')
+    yield RedisStateStore(cache, ttl=1)
+    await cache.clear(namespace='principal:')
+
+
+@pytest.mark.asyncio
+class TestSocialState:
+    async def test_ttl_and_size(self):
+        store = LocalStateStore(maxsize=2, ttl=0.05)
+        for code in ('a', 'b', 'c'):
+            await store.set(code, get_schema())
+        # the oldest entry is evicted
+        assert await store.get('a') is None
+        assert await store.get('b') is not None
+
+        time.sleep(0.06)
+        assert await store.get('b') is None
+        assert len(store.entries) <= 2
+
+    async def test_pop(self):
+        store = LocalStateStore(maxsize=10, ttl=60)
+        schema = get_schema()
+        await store.set('code', schema)
+        assert await store.pop('code') is schema
+        assert await store.pop('code') is None
+
+    async def test_redis(self, redis_store):
+        store = redis_store
+        schema = get_schema(email='user@example.com')
+        await store.set('code', schema)
+        assert await store.get('code') == schema
+        assert await store.pop('code') == schema
+        assert await store.pop('code') is None
+        assert await store.get('code') is None
+
+        await store.set('once', schema)
+        popped = await asyncio.gather(*(store.pop('once') for _ in range(3)))
+        assert popped.count(schema) == 1
+
+        await store.set('cleared', schema)
+        await store.clear()
+        assert await store.get('cleared') is None
+        # keys of other namespaces are kept
+        assert await store.redis.get('other', namespace='principal:') is not None
+
+    async def test_serialization(self):
+        schema = get_schema(email='user@example.com', application_account_id=1)
+        loaded = state._loads(state._dumps(schema))
+        assert type(loaded) is type(schema)
+        assert loaded == schema
+        assert loaded.get_type_and_user_id() == schema.get_type_and_user_id()
+
+    async def test_token_is_issued_once(self, async_client):
+        schema = get_schema(email='user@example.com', application_account_id=1)
+        await social_states.set('once', schema)
+
+        responses = await asyncio.gather(*(
+            async_client.post('/auth/social/token', json=dict(code='once'))
+            for _ in range(3)
+        ))
+        assert sorted(r.status_code for r in responses) == [200, 400, 400]
+
+    async def test_not_confirmed_email(self, async_client):
+        await social_states.set('no_email', get_schema())
+        for _ in range(2):
+            resp = await async_client.post(
+                '/auth/social/token', json=dict(code='no_email')
+            )
+            assert resp.status_code == 400
+        # entry is kept for confirmation of email
+        assert await social_states.get('no_email') is not None
+        await social_states.pop('no_email')
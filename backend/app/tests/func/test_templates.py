@@ -0,0 +1,75 @@
+"""
+Render cache of email templates.
+
+Renders per second are compared by a benchmark: pytest -m benchmark
+"""
+
+import time
+
+import pytest
+
+from services.mailing import messages, sender
+
+
+RENDERS = 200
+
+
+@pytest.fixture
+def render_cache():
+    sender._render_cache.clear()
+    yield sender._render_cache
+    sender._render_cache.clear()
+
+
+def renders_per_second(render) -> float:
+    started = time.perf_counter()
+    for _ in range(RENDERS):
+        render()
+    return RENDERS / (time.perf_counter() - started)
+
+
+class TestRender:
+    def test_precompile(self):
+        sender.precompile_templates()
+        assert 'confirm.html' in sender.template_env.list_templates()
+
+    def test_static_context(self, render_cache):
+        first = messages.PasswordWasChangedMessage(email='a@example.com')
+        second = messages.PasswordWasChangedMessage(email='b@example.com')
+        template = first.get_template()
+        # the template doesn't use email, so it's rendered once
+        assert first.get_payload() == second.get_payload()
+        assert first.get_payload()['value'] \
+            == template.render(**first.get_context())
+        assert len(render_cache) == 1
+
+    def test_variables(self, render_cache):
+        url = 'https://example.com/{}'
+        first = messages.SuccessfulRegistrationMessage(email='a@example.com')
+        second = messages.SuccessfulRegistrationMessage(
+            email='a@example.com', url=url.format(2)
+        )
+        assert url.format(2) in second.get_payload()['value']
+        assert url.format(2) not in first.get_payload()['value']
+        assert len(render_cache) == 2
+
+        # batch payload of messages with substitutions is the same
+        confirm = [
+            messages.ConfirmAccountMessage(account_id=i, email='a@example.com')
+            for i in range(3)
+        ]
+        payloads = [m.get_batch_payload(m.get_context()) for m in confirm]
+        assert payloads[0] == payloads[1] == payloads[2]
+        assert len(render_cache) == 3
+
+    @pytest.mark.benchmark
+    def test_renders_per_second(self, render_cache):
+        message = messages.PasswordWasChangedMessage(email='a@example.com')
+
+        def render_uncached():
+            render_cache.clear()
+            return message.get_payload()
+
+        uncached = renders_per_second(render_uncached)
+        cached = renders_per_second(message.get_payload)
+        assert cached > uncached
@@ -0,0 +1,87 @@
+import time
+from typing import Any, Hashable, Optional
+from collections import OrderedDict
+
+from aiocache.base import BaseCache
+
+
+# GET and DEL in one step, so only one caller gets the value
+REDIS_POP = """
+local value = redis.call('GET', KEYS[1])
+redis.call('DEL', KEYS[1])
+return value
+"""
+
+# DEL of keys matching the pattern, by chunks fitting unpack()
+REDIS_CLEAR = """
+local keys = redis.call('KEYS', ARGV[1])
+for i = 1, #keys, 1000 do
+    redis.call('DEL', unpack(keys, i, math.min(i + 999, #keys)))
+end
+return #keys
+"""
+
+
+class TTLCache:
+    """
+    In-process LRU cache, which entries expire after ttl seconds.
+
+    Example:
+        cache = TTLCache(maxsize=1024, ttl=60)
+        cache.set('key', 'value')
+        cache.get('key')  # 'value' for the next 60 seconds, then None
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            expires_at, value = self._entries[key]
+        except KeyError:
+            return default
+
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        value = self.get(key, default)
+        self._entries.pop(key, None)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# aiocache 0.11.1 (pinned in poetry.lock) has no public API to build keys
+# with namespace for raw commands and to deserialize their results,
+# and its clear() without namespace flushes the whole redis database.
+# Private parts of aiocache are used only here.
+
+async def redis_pop(cache: BaseCache, key: str) -> Any:
+    """Get and delete the value of redis cache at once"""
+    raw = await cache.raw("eval", REDIS_POP, keys=[cache._build_key(key)])
+    if raw is None:
+        return None
+    return cache.serializer.loads(raw)
+
+
+async def redis_clear(cache: BaseCache) -> None:
+    """Delete keys of the cache namespace only"""
+    await cache.raw("eval", REDIS_CLEAR, keys=[], args=[cache._build_key("*")])
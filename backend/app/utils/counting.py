@@ -0,0 +1,138 @@
+from __future__ import annotations
+import json
+from typing import TYPE_CHECKING, Hashable, Optional
+
+from sqlalchemy import distinct, func, literal_column, select, text, tuple_
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.expression import ClauseElement, Join
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.settings import settings
+from extra.enums import CountStrategy
+from utils.cache import TTLCache
+
+if TYPE_CHECKING:
+    from db.model import Model
+
+
+count_cache = TTLCache(
+    maxsize=settings.COUNT_CACHE_SIZE, ttl=settings.COUNT_CACHE_TTL
+)
+
+_reltuples = text(
+    "SELECT CAST(reltuples AS bigint) FROM pg_class "
+    "WHERE oid = CAST(:table AS regclass)"
+)
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN of the statement, which gives planner estimates"""
+
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def get_count_query(model: Model, query: Optional[Select] = None) -> Select:
+    """
+    Count of rows selected by query: limit, offset, sorting
+    and eager loading are dropped, filters and joins are kept.
+    """
+    if query is None:
+        query = select(model)
+
+    pk = model.__mapper__.primary_key
+    count_query = query.with_only_columns(func.count(pk[0])) \
+        .order_by(None) \
+        .limit(None) \
+        .offset(None)
+    if has_joins(count_query):
+        # rows are multiplied by joins of collections
+        column = pk[0] if len(pk) == 1 else tuple_(*pk)
+        count_query = count_query.with_only_columns(func.count(distinct(column)))
+    return count_query
+
+
+def has_joins(query: Select) -> bool:
+    return any(isinstance(from_, Join) for from_ in query.froms)
+
+
+def get_signature(count_query: Select) -> Hashable:
+    """Key of count query with its filter values"""
+    compiled = count_query.compile()
+    return str(compiled), repr(sorted(compiled.params.items()))
+
+
+async def estimate_count(db: AsyncSession, count_query: Select) -> int:
+    """
+    Planner estimate of PostgreSQL: statistics of the table
+    for unfiltered query and EXPLAIN of the filtered one.
+    """
+    if count_query.whereclause is None and not has_joins(count_query):
+        table = count_query.froms[0]
+        return await db.scalar(_reltuples, dict(table=table.fullname))
+
+    rows_query = count_query.with_only_columns(literal_column("1"))
+    plan = await db.scalar(Explain(rows_query))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+async def fetch_with_count(
+    db: AsyncSession,
+    query: Select,
+) -> tuple[list[Model], Optional[int]]:
+    """
+    Fetches rows of the query (usually a page) together with count
+    of all rows matching its filters by count(*) OVER () in a single statement.
+    Page of joined eager loading is selected in subquery, so the count
+    isn't multiplied by loaded collections.
+
+    Count is unknown (None) if no rows are fetched.
+    """
+    total = func.count().over().label("total")
+    rows = (await query.add_columns(total).unique(db)).all()
+    if not rows:
+        return [], None
+    return [row[0] for row in rows], rows[0].total
+
+
+async def count(
+    db: AsyncSession,
+    count_query: Select,
+    strategy: CountStrategy = CountStrategy.exact,
+) -> tuple[int, CountStrategy]:
+    """
+    Count of rows by strategy:
+      exact - count(*) of the filtered rows
+      estimate - planner estimate, it's precise enough for large lists only,
+        so exact count is taken below COUNT_ESTIMATE_THRESHOLD
+      cached - exact count cached by filters for COUNT_CACHE_TTL seconds
+      window - count is fetched with the page (see fetch_with_count),
+        it's exact when counted separately
+
+    Returns the count and strategy which was actually used.
+    """
+    if strategy is CountStrategy.cached:
+        signature = get_signature(count_query)
+        total = count_cache.get(signature)
+        if total is None:
+            total = await count_query.scalar(db)
+            count_cache.set(signature, total)
+        return total, strategy
+
+    if strategy is CountStrategy.estimate and db.bind.dialect.name == "postgresql":
+        total = await estimate_count(db, count_query)
+        if total >= settings.COUNT_ESTIMATE_THRESHOLD:
+            return total, strategy
+
+    return await count_query.scalar(db), CountStrategy.exact
@@ -2,11 +2,11 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, TypeVar
 from functools import wraps
 
-from sqlalchemy import func as sa_func
-from sqlalchemy import select
-
 from schemas import ResultSchema, ResultMeta
 from schemas.base import BaseModel
+from extra.enums import CountStrategy
+from utils import counting
+from utils.pagination import Page
 
 if TYPE_CHECKING:
     from db.model import Model
@@ -17,23 +17,52 @@ ModelSchema = TypeVar("ModelSchema", bound=BaseModel)
 
 def add_count(
     response_model: Model,
-    response_schema: ModelSchema
+    response_schema: ModelSchema,
+    count_strategy: CountStrategy = CountStrategy.exact,
 ):
     """
     Add meta information - count of all rows to the response.
 
     Gets a list of model objects and adds a count of all objects in this
-    model to the resulting schema.
+    model to the resulting schema. Function can also return a dict of
+    additional meta fields as the third item.
+
+    If function returns a Page instead of list, the page is fetched
+    and rows matching its filters are counted (see utils.counting.count
+    about count strategies). With window strategy the page and the count
+    are fetched in one statement, unless the page is selected by cursor
+    or filters join collections - these are counted separately.
     """
 
     def decorator(func):
         @wraps(func)
         async def create_new_schema(*args, **kwargs):
-            instances, db = await func(*args, **kwargs)
-            total_rows = await select(sa_func.count(response_model.id)).scalar(db)
+            instances, db, *extra = await func(*args, **kwargs)
+            meta = dict(extra[0]) if extra else {}
+            total_rows, strategy = None, count_strategy
+            if isinstance(instances, Page):
+                page = instances
+                count_query = counting.get_count_query(
+                    response_model, page.filtered_query
+                )
+                if strategy is CountStrategy.window and not page.is_keyset \
+                        and not counting.has_joins(count_query):
+                    instances, total_rows = await counting.fetch_with_count(
+                        db, page.query
+                    )
+                else:
+                    instances = await page.query.all(db)
+                meta.setdefault("next_cursor", page.next_cursor(instances))
+            else:
+                count_query = counting.get_count_query(response_model)
+
+            if total_rows is None:
+                total_rows, strategy = await counting.count(
+                    db, count_query, strategy
+                )
             return ResultSchema(
                 result=[response_schema.from_orm(x) for x in instances],
-                meta=ResultMeta(count=total_rows),
+                meta=ResultMeta(count=total_rows, count_strategy=strategy, **meta),
             )
 
         return create_new_schema
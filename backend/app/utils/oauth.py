@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+
+logger = logging.getLogger("oauth")
+
+# request wasn't sent, so retry can't use OAuth code twice
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# service didn't process request; after 502 and 504 it could use the code
+RETRY_STATUSES = (503,)
+
+
+class OAuthProvider:
+    """
+    Requests to API of OAuth service by the shared async client.
+
+    Each provider has its own timeout and limit of concurrent requests,
+    so a slow service doesn't take all connections of the client
+    and requests to it wait for their turn instead. Requests which
+    didn't reach the service are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        client: httpx.AsyncClient,
+        timeout: float,
+        concurrency: int,
+        retries: int = 2,
+        retry_backoff: float = 0.2,
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.client = client
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def get(self, path: str, params: Optional[dict] = None) -> httpx.Response:
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                last_attempt = attempt == self.retries
+                try:
+                    response = await self.client.get(
+                        f"{self.base_url}{path}", params=params, timeout=self.timeout
+                    )
+                except RETRY_ERRORS as e:
+                    if last_attempt:
+                        raise
+                    logger.warning("Retry of request to %s: %r", self.name, e)
+                else:
+                    if last_attempt or response.status_code not in RETRY_STATUSES:
+                        return response
+                    logger.warning(
+                        "Retry of request to %s: status %s",
+                        self.name, response.status_code,
+                    )
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
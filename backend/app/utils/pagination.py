@@ -0,0 +1,75 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from sqlalchemy.sql import Select
+
+import errors
+from core.security import decode_cursor, encode_cursor
+
+if TYPE_CHECKING:
+    from db.model import Model
+    from api.deps.deps_common import CommonQueryParams
+
+
+class Page(NamedTuple):
+    # query of the page rows
+    query: Select
+    # query of all the rows matching filters, it's used for counting
+    filtered_query: Select
+    # unique sort attributes to make cursor of the next page
+    sort_attrs: list[str]
+    limit: int
+    # page is selected by cursor
+    is_keyset: bool = False
+
+    def next_cursor(self, instances: list[Model]) -> Optional[str]:
+        return get_next_cursor(instances, self.sort_attrs, self.limit)
+
+
+def paginate(
+    model: Model,
+    params: CommonQueryParams,
+    filters: Optional[dict] = None,
+) -> Page:
+    """
+    Query of the page selected by cursor or by skip and limit.
+
+    Keyset pagination is used with cursor: the page is selected by index seek
+    after the last row of the previous page, so it doesn't slow down
+    on deep pages like offset does.
+
+    Filters are the same as for smart_query.
+    """
+    try:
+        sort_attrs = model.keyset_columns(*params.sort)
+        query = model.smart_query(filters=filters, sort_attrs=sort_attrs) \
+            .limit(params.limit)
+        if params.cursor:
+            values = decode_cursor(params.cursor, sort_attrs)
+            query = query.filter(*model.seek_expr(sort_attrs, values))
+        else:
+            query = query.offset(params.skip)
+    except (KeyError, ValueError):
+        raise errors.BadSortParams
+
+    return Page(
+        query=query,
+        filtered_query=model.smart_query(filters=filters),
+        sort_attrs=sort_attrs,
+        limit=params.limit,
+        is_keyset=bool(params.cursor),
+    )
+
+
+def get_next_cursor(
+    instances: list[Model],
+    sort_attrs: list[str],
+    limit: int,
+) -> Optional[str]:
+    if not instances or len(instances) < limit:
+        # the last page
+        return None
+
+    last = instances[-1]
+    values = [getattr(last, attr.lstrip('-')) for attr in sort_attrs]
+    return encode_cursor(sort_attrs, values)